@@ -0,0 +1,100 @@
+"""
+Benchmark of the lineup engine against the former networkx implementation of
+Team.start_active, on synthetic rosters of various sizes.
+
+    $ python benchmarks/bench_lineup.py [repeat]
+
+Both implementations must reach the same lineup value (ties between equivalent
+players can be broken differently).
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import random
+import timeit
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pyfantasy import lineup  # noqa: E402
+from pyfantasy.pyfantasy import Player  # noqa: E402
+from pyfantasy.rule_parser import rule_parser  # noqa: E402
+from pyfantasy.xml_stream import PlayerRecord  # noqa: E402
+
+RULES = json.load(open(os.path.join(os.path.dirname(__file__), '..', 'pyfantasy',
+                                    'rule.json')))
+POSITIONS = ['C', 'C', 'LW', 'LW', 'RW', 'RW', 'D', 'D', 'D', 'D', 'Util', 'G', 'G',
+             'BN', 'BN', 'IR']
+ELIGIBLE = [['C'], ['LW', 'RW'], ['C', 'LW'], ['D'], ['G'], ['RW'], ['C', 'RW']]
+TEAMS = ['Bos', 'Mtl', 'Tor', 'NYR', 'Pit', 'Chi', 'Edm', 'Cgy', 'Van', 'LA']
+
+
+def make_roster(n, seed=0):
+    rnd = random.Random(seed)
+    players = []
+    for i in range(n):
+        record = PlayerRecord(
+            player_key='nhl.p.{}'.format(i), name={'full': 'Player {}'.format(i)},
+            selected_position=rnd.choice(POSITIONS), position='',
+            eligible_positions=rnd.choice(ELIGIBLE), nhl_team=rnd.choice(TEAMS),
+            status=rnd.choice(['OK'] * 8 + ['DTD', 'IR']), rank=rnd.randint(1, 700))
+        players.append(Player(record, None))
+    return players
+
+
+def networkx_lineup(players, roster_positions, rules, playing_teams):
+    """ Former implementation of Team.start_active. """
+    import networkx as nx
+    pos_list = []
+    c = Counter()
+    for p in roster_positions:
+        c[p] += 1
+        pos_list.append((p, c[p]))
+    pos_list += [('BN', 99), ('BN', 98), ('BN', 97), ('BN', 96)]
+    G = nx.Graph()
+    for player in players:
+        for pos_u in pos_list:
+            for pos in player.eligible_positions + ['BN']:
+                if pos_u[0] == pos:
+                    weight = 1000 - player.rank
+                    weight = rule_parser(weight, player, pos, playing_teams, rules)
+                    G.add_edge(pos_u, player.name['full'], weight=weight)
+            if ((player.selected_position in ['IR', 'IR+']) and
+                    (player.selected_position == pos_u[0])):
+                G.add_edge(pos_u, player.name['full'], weight=1001)
+    return G, nx.max_weight_matching(G)
+
+
+def engine_lineup(players, roster_positions, rules, playing_teams):
+    slots = lineup.roster_slots(roster_positions)
+    weights = lineup.build_weights(players, slots, rules, playing_teams)
+    return lineup.assign(players, slots, weights)
+
+
+def value(graph, pairs):
+    return sum(graph[u][v]['weight'] for u, v in pairs)
+
+
+def main(repeat=5):
+    playing = set(TEAMS[:6])
+    print('{:>8} {:>14} {:>14} {:>8}'.format('players', 'networkx (ms)', 'engine (ms)',
+                                           'speedup'))
+    for n in (16, 20, 25, 40):
+        players = make_roster(n, seed=n)
+        graph, ref = networkx_lineup(players, POSITIONS, RULES, playing)
+        best = engine_lineup(players, POSITIONS, RULES, playing)
+        pairs = [(k, v) for k, v in best.items() if isinstance(v, tuple)]
+        assert abs(value(graph, ref) - value(graph, pairs)) < 1e-6, n
+
+        t_nx = min(timeit.repeat(lambda: networkx_lineup(players, POSITIONS, RULES, playing),
+                                 number=1, repeat=repeat))
+        t_en = min(timeit.repeat(lambda: engine_lineup(players, POSITIONS, RULES, playing),
+                                 number=1, repeat=repeat))
+        print('{:>8} {:>14.2f} {:>14.2f} {:>7.1f}x'.format(n, t_nx * 1e3, t_en * 1e3,
+                                                         t_nx / t_en))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
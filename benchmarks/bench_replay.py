@@ -0,0 +1,99 @@
+"""
+Benchmark suite running on recorded responses, without network access.
+
+The responses of a synthetic league (see tests/synthetic.py) are first recorded with
+RecordingTransport, then every benchmark runs on a Connection using
+ReplayTransport:
+- team: Team construction (roster, ranks and league settings)
+- start_active: lineup of rosters of 16 to 40 players
+- standings, scoreboard, scoreboards: parsing of the league resources
+- transactions: paging through every transaction of the league
+- iter_players: scan of the available players pool with ranks
+- recommend_swaps: best free agents of the pool for a week
+
+    $ python benchmarks/bench_replay.py [repeat] [latency_ms]
+
+latency_ms adds a simulated network latency to every request.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import shutil
+import timeit
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from pyfantasy import Connection  # noqa: E402
+from pyfantasy.transport import ReplayTransport  # noqa: E402
+import synthetic  # noqa: E402
+
+RULES = json.load(open(os.path.join(os.path.dirname(__file__), '..', 'pyfantasy',
+                                    'rule.json')))
+PLAYING = {'Bos', 'Mtl', 'Tor', 'NYR', 'Pit', 'Chi'}
+SCHEDULE = dict((day, set(synthetic.NHL_TEAMS[day % 4:day % 4 + 5])) for day in range(7))
+WEEKS = list(range(1, 21))
+
+
+def load_team(conn, n):
+    team = conn.get_team(synthetic.team_key(n), get_rank=True)
+    team.players
+    team.league
+    return team
+
+
+def scenarios(conn):
+    """ Returns the benchmarks as (name, function) on a connection. The team
+    benchmark gets a new connection every time, as the connection keeps the
+    teams it built. """
+    transport = conn.transport
+    league = load_team(conn, 1).league
+    teams = dict((size, load_team(conn, n))
+                 for n, size in sorted(synthetic.ROSTER_SIZES.items()))
+    out = [('team', lambda: load_team(Connection(None, transport=transport), 1))]
+    for size, team in sorted(teams.items()):
+        out.append(('start_active ({} players)'.format(size),
+                    lambda team=team: team.start_active(RULES, PLAYING)))
+    out += [
+        ('standings', league.get_standings),
+        ('scoreboard', league.get_scoreboard),
+        ('scoreboards ({} weeks)'.format(len(WEEKS)),
+         lambda: league.get_scoreboards(WEEKS)),
+        ('transactions ({})'.format(synthetic.NUM_TRANSACTIONS),
+         lambda: list(league.iter_transactions(since=0))),
+        ('iter_players ({})'.format(synthetic.POOL_SIZE),
+         lambda: list(league.iter_players(ranks=True))),
+        ('recommend_swaps ({})'.format(synthetic.POOL_SIZE),
+         lambda: teams[16].recommend_swaps(RULES, SCHEDULE,
+                                           pool_size=synthetic.POOL_SIZE)),
+    ]
+    return out
+
+
+def record(directory):
+    """ Records the responses used by every benchmark in directory. """
+    conn = synthetic.connection(directory)
+    for _, func in scenarios(conn):
+        func()
+    return len(os.listdir(directory))
+
+
+def main(repeat=5, latency_ms=0):
+    directory = tempfile.mkdtemp(prefix='pyfantasy-fixtures-')
+    try:
+        print('Recorded {} responses'.format(record(directory)))
+        conn = Connection(None, transport=ReplayTransport(directory, latency_ms / 1e3))
+        print('{:<28} {:>10}'.format('benchmark', 'best (ms)'))
+        for name, func in scenarios(conn):
+            best = min(timeit.repeat(func, number=1, repeat=repeat))
+            print('{:<28} {:>10.2f}'.format(name, best * 1e3))
+        conn.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -1,3 +1,47 @@
-from .pyfantasy import Connection
-from .pyfantasy import League, Team, Player
-from .yahoo_oauth import OAuth2
+import sys
+from importlib import import_module
+
+# name -> module defining it. The modules are imported on first access (python
+# 3.7+), so that a script only pays for the parts of the package it uses.
+_EXPORTS = {
+    'Connection': 'pyfantasy',
+    'League': 'pyfantasy',
+    'Team': 'pyfantasy',
+    'Player': 'pyfantasy',
+    'TransactionCursor': 'pyfantasy',
+    'SettingsSnapshot': 'pyfantasy',
+    'OAuth2': 'yahoo_oauth',
+    'ResponseCache': 'cache',
+    'MemoryCache': 'cache',
+    'SqliteCache': 'cache',
+    'Throttle': 'throttle',
+    'PlayerTable': 'player_table',
+    'compile_rules': 'rule_parser',
+    'StatsWarehouse': 'warehouse',
+    'Counters': 'instrument',
+    'LoggingHook': 'instrument',
+    'RecordingTransport': 'transport',
+    'ReplayTransport': 'transport',
+    'Schedule': 'schedule',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def _load(name):
+    value = getattr(import_module('.' + _EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in _EXPORTS:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+        return _load(name)
+
+    def __dir__():
+        return sorted(set(globals()) | set(_EXPORTS))
+else:
+    for _name in _EXPORTS:
+        _load(_name)
@@ -0,0 +1,239 @@
+"""
+asyncio client for the Yahoo Fantasy Sports API (python 3 only).
+Required packages:
+- aiohttp
+
+All the requests run on the event loop, at most `max_concurrency' at a time.
+The League, Team and Player objects built are the regular synchronous ones,
+attached to the Connection owned by the AsyncConnection (same credentials), so
+their own methods keep working as usual.
+
+Example:
+    async with AsyncConnection('cred.json') as aconn:
+        teams = await aconn.get_teams(team_keys, get_rank=True)
+"""
+from __future__ import absolute_import
+
+import time
+import asyncio
+
+from xmltodict import parse
+from requests.exceptions import HTTPError
+
+from .pyfantasy import Connection, League, Player, MAX_KEYS, _chunks
+from .throttle import THROTTLED
+from .instrument import RequestEvent, url_template
+from . import xml_stream
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+BASE_URL = 'https://fantasysports.yahooapis.com/fantasy/v2/'
+
+
+def _http_error(r, text):
+    """ Error raised for a refused response r: aiohttp.ClientResponseError for
+    the responses of the API, requests.HTTPError (as Connection) for the
+    responses of an offline transport. """
+    if aiohttp is not None and isinstance(r, aiohttp.ClientResponse):
+        return aiohttp.ClientResponseError(r.request_info, r.history, status=r.status,
+                                           message=text, headers=r.headers)
+    if r.status_code in THROTTLED:
+        return HTTPError('{} Throttled: {}'.format(r.status_code, r.url), response=r)
+    return HTTPError('{} Error: {} for url: {}'.format(r.status_code, r.reason, r.url),
+                     response=r)
+
+
+class AsyncConnection:
+    """ asyncio counterpart of Connection.
+    - filepath: path to the credentials file (see Connection)
+    - game_key: Yahoo's key for the sport/year
+    - max_concurrency: maximum number of requests in flight at the same time
+    - cache: optional ResponseCache, shared with the synchronous connection
+    - throttle: optional Throttle, shared with the synchronous connection
+    - hooks: instrumentation hooks, shared with the synchronous connection
+    - transport: offline transport of the synchronous connection (see transport)
+    - snapshot: SettingsSnapshot of the league settings (see Connection)
+    """
+
+    def __init__(self, filepath, game_key='nhl', max_concurrency=20, cache=None,
+                 throttle=None, hooks=None, transport=None, snapshot=None):
+        if aiohttp is None:
+            raise ImportError('Could not import package aiohttp. This package is '
+                              'necessary to use AsyncConnection.')
+        self.connection = Connection(filepath, game_key, cache=cache,
+                                     throttle=throttle, hooks=hooks,
+                                     transport=transport, snapshot=snapshot)
+        self.game_key = game_key
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+
+    def _open(self):
+        # aiohttp sessions and semaphores must be created inside the running loop
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def _send(self, url):
+        """ Returns: [tuple] status, headers, text and the response """
+        session = self._open()
+        transport = self.connection.transport
+        if transport is not None:
+            # offline transports are synchronous, run them in the default executor
+            async with self._semaphore:
+                r = await asyncio.get_event_loop().run_in_executor(
+                    None, transport.get, BASE_URL + url)
+            return r.status_code, r.headers, r.text, r
+        headers = {'Authorization': 'Bearer {}'.format(self.connection.oauth.access_token)}
+        async with self._semaphore:
+            async with session.get(BASE_URL + url, headers=headers) as r:
+                return r.status, r.headers, await r.text(), r
+
+    async def _request(self, url):
+        """ Sends a GET request through the rate limiter of the connection,
+        retrying it when throttled.
+        Returns: [tuple] status, text, response, number of retries, time spent
+                 waiting for the responses
+        """
+        throttle = self.connection.throttle
+        attempt = 0
+        network_time = 0.
+        while True:
+            await asyncio.sleep(throttle.reserve())
+            oauth = self.connection.oauth
+            loop = asyncio.get_event_loop()
+            if oauth is not None and not oauth.token_is_valid():
+                await loop.run_in_executor(None, oauth.refresh)
+            token = None if oauth is None else oauth.access_token
+            start = time.time()
+            status, headers, text, r = await self._send(url)
+
+            # If the requests is refused, refresh the token and retry
+            if status in [401, 403] and oauth is not None:
+                await loop.run_in_executor(None, oauth.refresh, token)
+                status, headers, text, r = await self._send(url)
+            network_time += time.time() - start
+
+            delay = throttle.retry_delay(status, headers, attempt)
+            if delay is None:
+                return status, text, r, attempt, network_time
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get(self, url):
+        """ Retrieves API info and parses it.
+        Returns: [dict] parsed data
+        """
+        url = Connection._strip_url(url)
+        return await self._fetch(url, url, lambda text: parse(text)['fantasy_content'])
+
+    async def _fetch(self, url, key, parse_text):
+        """ Same as Connection._fetch, on the event loop. """
+        instruments = self.connection.instruments
+        cache = self.connection.cache
+        if cache is not None:
+            data = cache.get(key)
+            if data is not None:
+                if instruments.hooks:
+                    instruments.emit(RequestEvent(
+                        url, url_template(url), None, 0, 0., 0., True, 0))
+                return data
+
+        status, text, r, retries, network_time = await self._request(url)
+        start = time.time()
+        try:
+            # If the request is still refused, raise error!
+            if status >= 400 or status in THROTTLED:
+                raise _http_error(r, text)
+            data = parse_text(text)
+        finally:
+            if instruments.hooks:
+                instruments.emit(RequestEvent(
+                    url, url_template(url), status, len(text), network_time,
+                    time.time() - start, False, retries))
+        if cache is not None:
+            cache.set(key, data)
+        return data
+
+    async def stream(self, url, extractor):
+        """ Retrieves API info and parses it with a streaming extractor of
+        xml_stream (see Connection.stream).
+        Returns: [list] records yielded by the extractor
+        """
+        url = Connection._strip_url(url)
+        key = '{}#{}'.format(url, extractor.__name__)
+        return await self._fetch(url, key, lambda text: list(extractor(text)))
+
+    async def get_ranks(self, player_keys):
+        """ Retrieves the draft rank of many players, one concurrent call per
+        MAX_KEYS players.
+        Returns: [dict] player_key: rank
+        """
+        urls = ['players;player_keys={}/draft_analysis'.format(','.join(chunk))
+                for chunk in _chunks(player_keys, MAX_KEYS)]
+        ranks = {}
+        for records in await asyncio.gather(*[
+                self.stream(url, xml_stream.iter_ranks) for url in urls]):
+            ranks.update(records)
+        return ranks
+
+    async def get_league(self, league_key):
+        """ Returns the League of the connection's identity map, building it if
+        needed. """
+        leagues = self.connection._leagues
+        league = leagues.get(league_key)
+        if league is None:
+            snapshot = self.connection.snapshot
+            settings = None if snapshot is None else snapshot.get(league_key)
+            if settings is None:
+                settings = await self.get('league/{}/settings'.format(league_key))
+            league = leagues.setdefault(
+                league_key, League(league_key, self.connection, settings=settings))
+        return league
+
+    async def get_team(self, team_key, get_rank=False, league=None):
+        """ Builds a Team, fetching its roster and league concurrently. The team
+        of the connection's identity map is reused if any. """
+        league_key = team_key[:team_key.rfind('.') - 2]
+        calls = [self.stream('team/{}/roster'.format(team_key), xml_stream.iter_rosters)]
+        if league is None:
+            calls.append(self.get_league(league_key))
+        res = await asyncio.gather(*calls)
+        league = res[1] if league is None else league
+        roster = res[0][0]
+        ranks = None
+        if get_rank or getattr(self.connection._teams.get(team_key), '_get_rank', False):
+            ranks = await self.get_ranks([p.player_key for p in roster.players])
+        return self.connection._team_from_roster(team_key, roster, league, ranks)
+
+    async def get_teams(self, team_keys, get_rank=False):
+        """ Builds many Teams concurrently. Teams of the same league share it. """
+        league_keys = sorted(set(k[:k.rfind('.') - 2] for k in team_keys))
+        leagues = await asyncio.gather(*[self.get_league(k) for k in league_keys])
+        leagues = dict(zip(league_keys, leagues))
+        return await asyncio.gather(*[
+            self.get_team(k, get_rank, leagues[k[:k.rfind('.') - 2]]) for k in team_keys])
+
+    async def get_player(self, player_key, get_rank=False):
+        data = await self.get('player/{}'.format(player_key))
+        player = Player(data['player'], self.connection)
+        if get_rank:
+            player.rank = (await self.get_ranks([player_key]))[player_key]
+        return player
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self.connection.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
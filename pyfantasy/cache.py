@@ -0,0 +1,176 @@
+"""
+Response cache used by Connection.get.
+
+The cache keys are the API urls (without the fantasy/v2/ prefix) and the
+values are the parsed responses. Streamed responses are stored under
+'url#extractor'. The time to live of an entry depends on the
+resource it comes from (see DEFAULT_TTLS); urls matching no rule are not cached.
+Two backends are available:
+- MemoryCache: LRU dictionary living in the process
+- SqliteCache: LRU table in a sqlite file, shared between processes and runs
+"""
+from __future__ import absolute_import
+
+import re
+import time
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# (regex on the url, time to live in seconds). The first matching rule is used.
+DEFAULT_TTLS = [
+    # pages of the players pool change with every add/drop: never cached, even
+    # with their /draft_analysis
+    (r'^league/[^/]+/players(;|/|#|$)', 0),
+    (r'/settings(;|/|#|$)', 6 * 3600),
+    (r'/roster(;|/|#|$)', 5 * 60),
+    (r'/draft_analysis(;|/|#|$)', 24 * 3600),
+]
+
+
+class MemoryCache:
+    """ In-memory LRU cache.
+    - max_entries: number of entries kept before evicting the least recently used
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ Returns the value stored for key or None if missing or expired. """
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                return None
+            self._data[key] = item
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.time() + ttl, value)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, prefix=''):
+        """ Removes every entry whose key starts with prefix. """
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SqliteCache:
+    """ LRU cache persisted in a sqlite file.
+    - path: path of the sqlite file (created if it does not exist)
+    - max_entries: number of entries kept before evicting the least recently used
+    """
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, '
+                             'expires REAL, accessed REAL, value BLOB)')
+
+    def get(self, key):
+        """ Returns the value stored for key or None if missing or expired. """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT expires, value FROM cache WHERE key = ?',
+                                   (key,)).fetchone()
+            if row is None:
+                return None
+            with self._db:
+                if row[0] < now:
+                    self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+                    return None
+                self._db.execute('UPDATE cache SET accessed = ? WHERE key = ?',
+                                 (now, key))
+        return pickle.loads(row[1])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        blob = sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+                             (key, now + ttl, now, blob))
+            self._db.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                             'ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                             (self.max_entries,))
+
+    def invalidate(self, prefix=''):
+        """ Removes every entry whose key starts with prefix. """
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM cache WHERE substr(key, 1, ?) = ?',
+                             (len(prefix), prefix))
+
+    def delete(self, key):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+class ResponseCache:
+    """ Cache policy plugged in a Connection.
+    - backend: MemoryCache (default) or SqliteCache
+    - ttls: list of (regex, seconds) rules, see DEFAULT_TTLS
+    Attributes hits and misses count the lookups of cacheable urls.
+    """
+
+    def __init__(self, backend=None, ttls=None):
+        self.backend = MemoryCache() if backend is None else backend
+        self.ttls = [(re.compile(r), t) for r, t in
+                     (DEFAULT_TTLS if ttls is None else ttls)]
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, url):
+        """ Returns the time to live of url, 0 if it should not be cached. """
+        for regex, ttl in self.ttls:
+            if regex.search(url):
+                return ttl
+        return 0
+
+    def get(self, url):
+        if not self.ttl(url):
+            return None
+        value = self.backend.get(url)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, url, value):
+        ttl = self.ttl(url)
+        if ttl:
+            self.backend.set(url, value, ttl)
+
+    def invalidate(self, prefix=''):
+        """ Removes every cached url starting with prefix (everything by default). """
+        self.backend.invalidate(prefix)
+
+    def delete(self, url):
+        """ Removes the cached response of url only. """
+        self.backend.delete(url)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.backend)}
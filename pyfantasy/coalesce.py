@@ -0,0 +1,224 @@
+"""
+Coalescing of the gets of single resources into collection calls.
+
+Calls of the same shape that only differ by key, e.g.
+    player/nhl.p.1/draft_analysis
+    player/nhl.p.2/draft_analysis
+are sent as one collection call
+    players;player_keys=nhl.p.1,nhl.p.2/draft_analysis
+and every caller gets its part of the response, with the shape it would have
+had with its own call ({'player': {...}}). Works for the player, team and
+league resources, MAX_KEYS keys per call.
+
+Two ways to collect the calls:
+- a Batch (Connection.batch()), whose gets return a Result and are sent when
+  the batch is closed
+- a Coalescer (Connection(coalesce_window=...)), which holds the gets made
+  by concurrent threads during a short window
+"""
+from __future__ import absolute_import
+
+import re
+import threading
+from collections import OrderedDict
+
+# Single resources having a collection form: kind, key, sub-resource
+SINGLE_RESOURCE = re.compile(r'^(player|team|league)/([^/;]+)(/.*)?$')
+
+
+def split_url(url):
+    """ Returns (kind, key, sub-resource) of a single resource url, None if the
+    url can't be coalesced. """
+    m = SINGLE_RESOURCE.match(url)
+    if m is None:
+        return None
+    return m.group(1), m.group(2), m.group(3) or ''
+
+
+def collection_url(kind, keys, sub):
+    return '{0}s;{0}_keys={1}{2}'.format(kind, ','.join(keys), sub)
+
+
+def split_collection(kind, keys, data):
+    """ Splits a parsed collection response into the responses of every key.
+    Returns: [dict] key -> {kind: data of the key}
+    """
+    items = (data.get(kind + 's') or dict()).get(kind, [])
+    if not isinstance(items, list):
+        items = [items]
+    by_key = dict((item.get(kind + '_key'), item) for item in items)
+    out = dict()
+    for i, key in enumerate(keys):
+        item = by_key.get(key)
+        # keys can come back normalized (e.g. nhl -> game id), in the same order
+        if item is None and len(items) == len(keys):
+            item = items[i]
+        if item is not None:
+            out[key] = {kind: item}
+    return out
+
+
+class Result:
+    """ Result of a call made by another thread. """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._value = None
+        self._error = None
+
+    def set(self, value):
+        self._value = value
+        self._event.set()
+
+    def fail(self, error):
+        self._error = error
+        self._event.set()
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """ Waits for the call and returns its data (raises its error). """
+        if not self._event.wait(timeout):
+            raise RuntimeError('Call not completed after {}s'.format(timeout))
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def send(connection, kind, sub, results):
+    """ Sends the collection call of results (OrderedDict key -> Result) and
+    sets every Result. The split responses are cached under their own url.
+    A single key is sent as its own call.
+    """
+    keys = list(results)
+    try:
+        if len(keys) == 1:
+            parts = {keys[0]: connection._get('{}/{}{}'.format(kind, keys[0], sub))}
+        else:
+            data = connection._get(collection_url(kind, keys, sub), cache=False)
+            parts = split_collection(kind, keys, data)
+    except Exception as e:
+        for result in results.values():
+            result.fail(e)
+        return
+    for key, result in results.items():
+        part = parts.get(key)
+        if part is None:
+            result.fail(KeyError('No {} {} in the collection response'.format(kind, key)))
+            continue
+        if len(keys) > 1 and connection.cache is not None:
+            connection.cache.set('{}/{}{}'.format(kind, key, sub), part)
+        result.set(part)
+
+
+def _cached(connection, url):
+    if connection.cache is None:
+        return None
+    return connection._cached(url, url)
+
+
+class Batch:
+    """ Collects gets and sends them, coalesced, when closed. The collection
+    calls and the other calls run concurrently in the connection's pool.
+
+        with conn.batch() as batch:
+            results = [batch.get('player/{}/draft_analysis'.format(k)) for k in keys]
+        data = [r.result() for r in results]
+    """
+
+    def __init__(self, connection, max_keys=25):
+        self.connection = connection
+        self.max_keys = max_keys
+        self.groups = OrderedDict()
+        self.others = OrderedDict()
+
+    def get(self, url):
+        """ Returns: [Result] of the get, available once the batch is sent """
+        url = self.connection._strip_url(url)
+        data = _cached(self.connection, url)
+        if data is not None:
+            result = Result()
+            result.set(data)
+            return result
+        parts = split_url(url)
+        if parts is None:
+            return self.others.setdefault(url, Result())
+        kind, key, sub = parts
+        group = self.groups.setdefault((kind, sub), OrderedDict())
+        return group.setdefault(key, Result())
+
+    def send(self):
+        jobs = []
+        for (kind, sub), group in self.groups.items():
+            keys = list(group)
+            for i in range(0, len(keys), self.max_keys):
+                jobs.append((kind, sub, OrderedDict(
+                    (k, group[k]) for k in keys[i:i + self.max_keys])))
+        jobs += [(None, url, result) for url, result in self.others.items()]
+        self.groups = OrderedDict()
+        self.others = OrderedDict()
+        self.connection.map(self._run, jobs)
+
+    def _run(self, job):
+        """ job: (kind, sub, results) of a group or (None, url, result) """
+        kind, sub_or_url, results = job
+        if kind is not None:
+            return send(self.connection, kind, sub_or_url, results)
+        try:
+            results.set(self.connection._get(sub_or_url))
+        except Exception as e:
+            results.fail(e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.send()
+
+
+class _Group:
+    def __init__(self):
+        self.results = OrderedDict()
+        self.full = threading.Event()
+
+
+class Coalescer:
+    """ Holds the gets of single resources during window seconds, so that the
+    ones made meanwhile by other threads are sent in the same collection call.
+    - window: seconds the first get of a group waits for others
+    - max_keys: a full group is sent without waiting
+    """
+
+    def __init__(self, connection, window=0.01, max_keys=25):
+        self.connection = connection
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._groups = dict()
+
+    def get(self, url):
+        data = _cached(self.connection, url)
+        if data is not None:
+            return data
+        parts = split_url(url)
+        if parts is None:
+            return self.connection._get(url)
+        kind, key, sub = parts
+        with self._lock:
+            group = self._groups.get((kind, sub))
+            leader = group is None
+            if leader:
+                group = self._groups[kind, sub] = _Group()
+            result = group.results.setdefault(key, Result())
+            if len(group.results) >= self.max_keys:
+                # the next gets start a new group
+                del self._groups[kind, sub]
+                group.full.set()
+        if leader:
+            group.full.wait(self.window)
+            with self._lock:
+                if self._groups.get((kind, sub)) is group:
+                    del self._groups[kind, sub]
+            send(self.connection, kind, sub, group.results)
+        return result.result()
@@ -0,0 +1,279 @@
+"""
+Long running process setting the lineups of many teams on one connection.
+
+LineupDaemon keeps a single Connection (login, cache, worker pool, league
+settings) alive and runs two jobs for every game day of the schedule:
+- set: lead seconds before the first game of the day. The rosters and ranks
+  of every team are loaded together (Connection.load_teams: collection calls,
+  one settings call for the teams of a league), then each team gets
+  start_active and update_roster, concurrently on the connection's pool
+- refresh: refresh seconds before the first game. The rosters are fetched
+  again, to account for the last injuries and status changes, and only the
+  lineups that changed are sent
+
+After every job the status (queue depth, job delays and durations, result of
+every team) is written to a json file. From the command line:
+
+    $ python -m pyfantasy cred.json 363.l.1.t.1 363.l.2.t.4 --schedule schedule.json \\
+          --cache cache.sqlite --snapshot settings.json --status status.json
+"""
+from __future__ import absolute_import, print_function
+
+import os
+import time
+import heapq
+import logging
+import argparse
+import itertools
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+from .pyfantasy import Connection, SettingsSnapshot
+from .rule_parser import compile_rules
+from .schedule import Schedule, as_date
+from .utils import json_get_data, json_write_data
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), 'rule.json')
+
+
+def _summary(values):
+    """ count, last, mean and max of the recent values of a measure """
+    values = list(values)
+    if not values:
+        return {'count': 0}
+    return {'count': len(values), 'last': round(values[-1], 3),
+            'mean': round(sum(values) / len(values), 3), 'max': round(max(values), 3)}
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+class LineupDaemon:
+    """ Sets the lineups of many teams every game day.
+    - connection: Connection used for every call
+    - team_keys: keys of the teams to manage
+    - rules: lineup rules (see rule.json), compiled once
+    - schedule: Schedule with the start times of the games, the connection's
+                by default
+    - lead: seconds before the first game of the day the lineups are set
+    - refresh: seconds before the first game the rosters are fetched again
+    - status_path: json file the status is written to after every job
+    - default_start: local 'HH:MM' used for the days without start times
+    - retry: seconds before a failed job is run again, until the first game
+    - dry_run: compute the lineups without sending them
+    """
+
+    def __init__(self, connection, team_keys, rules, schedule=None, lead=1800,
+                 refresh=300, status_path=None, default_start='19:00', retry=60,
+                 dry_run=False, clock=time.time):
+        self.connection = connection
+        self.team_keys = list(team_keys)
+        self.rules = compile_rules(rules)
+        self.schedule = schedule if schedule is not None else connection.schedule
+        if self.schedule is None:
+            raise ValueError('No schedule given and no schedule on the connection')
+        self.lead = lead
+        self.refresh = refresh
+        self.status_path = status_path
+        self.default_start = datetime.strptime(default_start, '%H:%M').time()
+        self.retry = retry
+        self.dry_run = dry_run
+        self.clock = clock
+        self._queue = []
+        self._seq = itertools.count()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.errors = 0
+        self.updates = 0
+        # seconds between the planned and the actual start of the jobs
+        self.delays = deque(maxlen=100)
+        self.durations = deque(maxlen=100)
+        self.team_durations = deque(maxlen=1000)
+        self.teams = dict()
+
+    def first_start(self, day):
+        """ Start time of the first game of day (default_start if unknown). """
+        first = self.schedule.first_start(day)
+        if first is None:
+            first = time.mktime(datetime.combine(day, self.default_start).timetuple())
+        return first
+
+    def schedule_day(self, day=None):
+        """ Queues the jobs of the next game day from day (today by default)
+        whose games have not started yet.
+        Returns: the game day, None after the end of the season
+        """
+        day = self.schedule.next_date(day or datetime.fromtimestamp(self.clock()).date())
+        while day is not None and self.first_start(day) <= self.clock():
+            day = self.schedule.next_date(day + timedelta(1))
+        if day is None:
+            return None
+        first = self.first_start(day)
+        self._push(first - self.lead, 'set', day)
+        self._push(first - self.refresh, 'refresh', day)
+        return day
+
+    def _push(self, when, kind, day):
+        heapq.heappush(self._queue, (when, next(self._seq), kind, day))
+
+    def run_pending(self):
+        """ Runs the jobs that are due.
+        Returns: number of jobs run
+        """
+        count = 0
+        while self._queue and self._queue[0][0] <= self.clock():
+            when, _, kind, day = heapq.heappop(self._queue)
+            self.run_job(kind, day, when)
+            count += 1
+        return count
+
+    def run(self, poll=60):
+        """ Runs the jobs as they become due until stop is called or the season
+        ends. Waits at most poll seconds at a time. """
+        if not self._queue:
+            self.schedule_day()
+        while self._queue and not self._stop.is_set():
+            delay = self._queue[0][0] - self.clock()
+            if delay > 0:
+                self._stop.wait(min(delay, poll))
+            else:
+                self.run_pending()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_job(self, kind, day, when=None):
+        """ Runs a set or refresh job for day now. """
+        started = self.clock()
+        if when is not None:
+            self.delays.append(max(started - when, 0))
+        logger.info('%s lineups of %d teams for %s', kind, len(self.team_keys), day)
+        retried = False
+        try:
+            if kind == 'refresh':
+                self.connection.invalidate('teams;')
+                self.connection.invalidate('team/')
+            teams = self.connection.load_teams(self.team_keys, get_rank=True)
+            playing = self.schedule.playing(day)
+            self.connection.map(lambda team: self._set_lineup(team, kind, day, playing),
+                                teams)
+        except Exception:
+            logger.exception('%s job of %s failed', kind, day)
+            self.errors += 1
+            retried = self.clock() + self.retry < self.first_start(day)
+            if retried:
+                self._push(self.clock() + self.retry, kind, day)
+        if kind == 'refresh' and not retried:
+            self.schedule_day(day + timedelta(1))
+        self.jobs += 1
+        self.durations.append(self.clock() - started)
+        self.write_status()
+
+    def _set_lineup(self, team, kind, day, playing):
+        started = self.clock()
+        result = {'date': day.isoformat(), 'job': kind}
+        try:
+            best = team.start_active(self.rules, playing)
+            changes = sum(1 for p in team.players if p.name['full'] in best and
+                          best[p.name['full']][0] != p.selected_position)
+            result['changes'] = changes
+            if changes and not self.dry_run:
+                team.update_roster(best, day=day)
+                with self._lock:
+                    self.updates += 1
+        except Exception as e:
+            logger.exception('Lineup of %s failed', team.team_key)
+            with self._lock:
+                self.errors += 1
+            result['error'] = repr(e)
+        result['seconds'] = round(self.clock() - started, 3)
+        with self._lock:
+            self.team_durations.append(result['seconds'])
+            self.teams[team.team_key] = result
+
+    def status(self):
+        """ Returns: [dict] state of the daemon, as written to status_path """
+        out = {
+            'time': _iso(self.clock()),
+            'teams_managed': len(self.team_keys),
+            'queue_depth': len(self._queue),
+            'next': None,
+            'jobs': self.jobs,
+            'errors': self.errors,
+            'updates': self.updates,
+            'job_delay': _summary(self.delays),
+            'job_seconds': _summary(self.durations),
+            'team_seconds': _summary(self.team_durations),
+            'throttle': self.connection.throttle.stats(),
+            'teams': dict(self.teams),
+        }
+        if self._queue:
+            when, _, kind, day = min(self._queue)
+            out['next'] = {'time': _iso(when), 'job': kind, 'date': day.isoformat()}
+        if self.connection.cache is not None:
+            out['cache'] = self.connection.cache.stats()
+        return out
+
+    def write_status(self):
+        if self.status_path is not None:
+            json_write_data(self.status(), self.status_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='pyfantasy', description='Sets the lineups of Yahoo fantasy teams before '
+        'the games of every day.')
+    parser.add_argument('credentials', help='credentials file (see yahoo_oauth)')
+    parser.add_argument('team_keys', nargs='+', help='keys of the teams to manage')
+    parser.add_argument('--schedule', required=True,
+                        help='schedule file (json or csv, see Schedule.from_file), '
+                        'fetched with --season if missing')
+    parser.add_argument('--season', help="season to fetch the schedule of, e.g. 20242025")
+    parser.add_argument('--rules', default=RULES_PATH, help='json file of lineup rules')
+    parser.add_argument('--cache', help='sqlite file of the response cache')
+    parser.add_argument('--snapshot', help='json file of the league settings snapshot')
+    parser.add_argument('--status', help='json file the status is written to')
+    parser.add_argument('--lead', type=float, default=30,
+                        help='minutes before the first game the lineups are set')
+    parser.add_argument('--refresh', type=float, default=5,
+                        help='minutes before the first game the rosters are refreshed')
+    parser.add_argument('--workers', type=int, default=20, help='size of the worker pool')
+    parser.add_argument('--once', action='store_true',
+                        help="set today's lineups now and exit")
+    parser.add_argument('--dry-run', action='store_true', help='do not send the lineups')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.season:
+        schedule = Schedule.fetch(args.season, path=args.schedule)
+    else:
+        schedule = Schedule.from_file(args.schedule)
+    cache = None
+    if args.cache:
+        from .cache import ResponseCache, SqliteCache
+        cache = ResponseCache(SqliteCache(args.cache))
+    snapshot = SettingsSnapshot(args.snapshot) if args.snapshot else None
+    connection = Connection(args.credentials, cache=cache, max_workers=args.workers,
+                            schedule=schedule, snapshot=snapshot)
+    daemon = LineupDaemon(connection, args.team_keys, json_get_data(args.rules),
+                          lead=args.lead * 60, refresh=args.refresh * 60,
+                          status_path=args.status, dry_run=args.dry_run)
+    try:
+        if args.once:
+            daemon.run_job('set', as_date(time.strftime('%Y-%m-%d')))
+        else:
+            import signal
+            signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+            daemon.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connection.close()
+    return 1 if daemon.errors else 0
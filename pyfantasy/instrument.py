@@ -0,0 +1,205 @@
+"""
+Instrumentation of the connection: every request and a few expensive steps
+(roster loading, lineup build and solve, roster updates) emit an event to the
+hooks of Connection.instruments. A hook is any callable taking the event:
+- a function, called with every event
+- LoggingHook, which logs them
+- Counters, which aggregates them as Prometheus-style counters
+
+Example:
+    counters = Counters()
+    conn = Connection('credentials.json', hooks=[counters, LoggingHook()])
+    team = conn.get_team(team_key)
+    print(counters.render())
+
+Without hooks, nothing is timed nor created.
+"""
+from __future__ import absolute_import
+
+import re
+import time
+import logging
+import functools
+import threading
+from collections import namedtuple, defaultdict
+
+RequestEvent = namedtuple('RequestEvent', [
+    'url', 'template', 'status', 'bytes', 'network_time', 'parse_time', 'cache_hit',
+    'retries'])
+SpanEvent = namedtuple('SpanEvent', ['name', 'duration', 'tags'])
+
+# Keys and values replaced in the urls, most specific first
+_TEMPLATES = [
+    (re.compile(r'\w+\.l\.\d+\.t\.\d+(,\w+\.l\.\d+\.t\.\d+)*'), '{team_key}'),
+    (re.compile(r'\w+\.l\.\d+(,\w+\.l\.\d+)*'), '{league_key}'),
+    (re.compile(r'\w+\.p\.\d+(,\w+\.p\.\d+)*'), '{player_key}'),
+    (re.compile(r'\d{4}-\d{2}-\d{2}'), '{date}'),
+    (re.compile(r'=\d+(,\d+)*'), '={n}'),
+]
+
+logger = logging.getLogger('pyfantasy')
+
+
+def url_template(url):
+    """ Returns the url with its keys and values replaced by placeholders, e.g.
+    'team/{team_key}/roster;date={date}', to group the events by resource.
+    """
+    for pattern, placeholder in _TEMPLATES:
+        url = pattern.sub(placeholder, url)
+    return url
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, instruments, name, tags):
+        self.instruments = instruments
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.instruments.emit(SpanEvent(self.name, time.time() - self.start, self.tags))
+
+
+class Instruments:
+    """ Dispatches events to hooks.
+    - hooks: list of callables taking a RequestEvent or a SpanEvent
+
+    A failing hook is logged and never interrupts the request.
+    """
+
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or [])
+
+    def add(self, hook):
+        self.hooks.append(hook)
+
+    def remove(self, hook):
+        self.hooks.remove(hook)
+
+    def emit(self, event):
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception('Instrumentation hook %r failed', hook)
+
+    def span(self, name, **tags):
+        """ Context manager timing its block as a SpanEvent. """
+        if not self.hooks:
+            return _NULL_SPAN
+        return _Span(self, name, tags)
+
+
+NO_INSTRUMENTS = Instruments()
+
+
+def timed(name, *attrs):
+    """ Decorator timing a method as a span of its parent connection.
+    - attrs: attributes of the object added to the span tags (e.g. team_key)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            instruments = getattr(self.parent, 'instruments', NO_INSTRUMENTS)
+            if not instruments.hooks:
+                return func(self, *args, **kwargs)
+            tags = dict((a, getattr(self, a, None)) for a in attrs)
+            with instruments.span(name, **tags):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class LoggingHook:
+    """ Logs every event.
+    - logger: logging.Logger, the 'pyfantasy' logger by default
+    - level: logging level of the messages
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('pyfantasy')
+        self.level = level
+
+    def __call__(self, event):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if isinstance(event, RequestEvent):
+            if event.cache_hit:
+                self.logger.log(self.level, 'GET %s cache hit', event.url)
+            else:
+                self.logger.log(
+                    self.level, 'GET %s %s %dB network=%.1fms parse=%.1fms retries=%d',
+                    event.url, event.status, event.bytes, event.network_time * 1e3,
+                    event.parse_time * 1e3, event.retries)
+        else:
+            self.logger.log(self.level, '%s %.1fms %s', event.name, event.duration * 1e3,
+                            event.tags)
+
+
+class Counters:
+    """ Aggregates the events as counters labelled by url template (requests)
+    or name (spans):
+    - requests_total (also labelled by status and cache), request_bytes_total,
+      request_network_seconds_total, request_parse_seconds_total,
+      request_retries_total
+    - span_total, span_seconds_total
+
+    render() returns them in the Prometheus text format.
+    """
+
+    def __init__(self, prefix='pyfantasy_'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.values = defaultdict(float)
+
+    def __call__(self, event):
+        with self._lock:
+            if isinstance(event, RequestEvent):
+                template = event.template
+                self.values['requests_total', (
+                    ('template', template), ('status', str(event.status or '')),
+                    ('cache', 'hit' if event.cache_hit else 'miss'))] += 1
+                if event.cache_hit:
+                    return
+                labels = (('template', template),)
+                self.values['request_bytes_total', labels] += event.bytes
+                self.values['request_network_seconds_total', labels] += event.network_time
+                self.values['request_parse_seconds_total', labels] += event.parse_time
+                self.values['request_retries_total', labels] += event.retries
+            else:
+                labels = (('name', event.name),)
+                self.values['span_total', labels] += 1
+                self.values['span_seconds_total', labels] += event.duration
+
+    def get(self, metric, **labels):
+        """ Returns the sum of a metric over the series matching the labels. """
+        with self._lock:
+            return sum(v for (m, series), v in self.values.items()
+                       if m == metric and set(labels.items()) <= set(series))
+
+    def reset(self):
+        with self._lock:
+            self.values.clear()
+
+    def render(self):
+        with self._lock:
+            items = sorted(self.values.items())
+        lines = []
+        for (metric, labels), value in items:
+            labels = ','.join('{}="{}"'.format(k, v.replace('"', '\\"')) for k, v in labels)
+            lines.append('{}{}{{{}}} {:g}'.format(self.prefix, metric, labels, value))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,350 @@
+"""
+Lineup engine used by Team.start_active.
+
+The lineup is an assignment problem between the players and the roster slots.
+A dense weight matrix (players x slots) is built once and solved as a linear
+sum assignment, with scipy if it is installed, else with the Hungarian
+algorithm below (vectorized with numpy when available). Every player can also
+be left unassigned with a weight of 0, so the result is the maximum weight
+matching of the (players, slots) bipartite graph.
+"""
+from __future__ import absolute_import
+
+import heapq
+from collections import Counter, OrderedDict, namedtuple
+
+from .rule_parser import compile_rules
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+# Weight of a (player, slot) pair that is not allowed
+INELIGIBLE = -1e9
+# Weight keeping a player on the IR spot they are already on
+IR_LOCK = 1001
+# Below this matrix size, numpy overhead makes the pure python solver faster
+NUMPY_MIN_SIZE = 5000
+# Bonus given to the previous day's positions, small enough to only break ties
+KEEP_BONUS = 1e-3
+# Extra bench slots, so that every player can be benched
+BENCH_SLOTS = [('BN', 99), ('BN', 98), ('BN', 97), ('BN', 96)]
+
+Swap = namedtuple('Swap', ['gain', 'drop', 'add'])
+
+
+def roster_slots(roster_positions):
+    """ Creates the list of unique slots from the league roster positions.
+    Final form is [('C', 1), ('C', 2), ('LW', 1), etc.] + BENCH_SLOTS
+    """
+    slots = []
+    c = Counter()
+    for p in roster_positions:
+        c[p] += 1
+        slots.append((p, c[p]))
+    return slots + BENCH_SLOTS
+
+
+def build_weights(players, slots, rules, playing_teams):
+    """ Builds the players x slots weight matrix.
+
+    The weight is 1000 - rank modified by the rules for the slots the player
+    is eligible at (or BN), INELIGIBLE otherwise. A player already on an IR or
+    IR+ slot is kept there with IR_LOCK.
+    - rules: list of rules or CompiledRules (see rule_parser.compile_rules)
+    Returns: numpy array if numpy is available, else list of lists
+    """
+    rules = compile_rules(rules)
+    positions = [pos for pos, _ in slots]
+    base = [[1000 - player.rank] * len(positions) for player in players]
+    weights = rules.apply(base, players, positions, playing_teams)
+    allowed = []
+    locked = []
+    for player in players:
+        eligible = set(player.eligible_positions + ['BN'])
+        ir = player.selected_position if player.selected_position in ['IR', 'IR+'] else None
+        allowed.append([pos in eligible for pos in positions])
+        locked.append([pos == ir for pos in positions])
+    if np is not None:
+        return np.where(locked, IR_LOCK, np.where(allowed, weights, INELIGIBLE))
+    return [[IR_LOCK if lock else (w if ok else INELIGIBLE)
+             for w, ok, lock in zip(row, row_ok, row_lock)]
+            for row, row_ok, row_lock in zip(weights, allowed, locked)]
+
+
+def _phase(cost, u, v, p, way, i):
+    """ Assigns row i (1-indexed) along the shortest augmenting path, keeping
+    the potentials u, v feasible. The other rows must be assigned optimally
+    (see _hungarian), row i may have been assigned before with other costs.
+    """
+    m = len(p) - 1
+    inf = float('inf')
+    p[0] = i
+    j0 = 0
+    minv = [inf] * (m + 1)
+    used = [False] * (m + 1)
+    while True:
+        used[j0] = True
+        i0 = p[j0]
+        row = cost[i0 - 1]
+        delta = inf
+        j1 = 0
+        for j in range(1, m + 1):
+            if not used[j]:
+                cur = row[j - 1] - u[i0] - v[j]
+                if cur < minv[j]:
+                    minv[j] = cur
+                    way[j] = j0
+                if minv[j] < delta:
+                    delta = minv[j]
+                    j1 = j
+        for j in range(m + 1):
+            if used[j]:
+                u[p[j]] += delta
+                v[j] -= delta
+            else:
+                minv[j] -= delta
+        j0 = j1
+        if p[j0] == 0:
+            break
+    while j0:
+        j1 = way[j0]
+        p[j0] = p[j1]
+        j0 = j1
+
+
+def _hungarian(cost):
+    """ Minimum cost assignment of a n x m cost matrix (n <= m), pure python.
+    Returns: [list] column assigned to each row
+    """
+    n, m = len(cost), len(cost[0])
+    u = [0.] * (n + 1)
+    v = [0.] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        _phase(cost, u, v, p, way, i)
+    cols = [0] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            cols[p[j] - 1] = j - 1
+    return cols
+
+
+def _hungarian_numpy(cost):
+    """ Same as _hungarian with the column loops vectorized with numpy. """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    cur = np.empty(m + 1)
+    cur[0] = np.inf
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            cur[1:] = cost[i0 - 1] - u[i0] - v[1:]
+            better = ~used & (cur < minv)
+            minv[better] = cur[better]
+            way[better] = j0
+            free_minv = np.where(used, np.inf, minv)
+            j1 = int(free_minv.argmin())
+            delta = free_minv[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.zeros(n, dtype=int)
+    matched = np.nonzero(p[1:])[0]
+    cols[p[1:][matched] - 1] = matched
+    return list(cols)
+
+
+def solve(weights):
+    """ Maximum weight assignment where each row can also stay unassigned.
+    Returns: [list] (row, column) pairs
+    """
+    n = len(weights)
+    if n == 0:
+        return []
+    m = len(weights[0])
+    # one zero-weight dummy column per row to allow it to stay unassigned
+    if np is not None and (linear_sum_assignment is not None or
+                           n * (m + n) >= NUMPY_MIN_SIZE):
+        weights = np.asarray(weights, dtype=float)
+        cost = -np.hstack([weights, np.zeros((n, n))])
+        if linear_sum_assignment is not None:
+            rows, cols = linear_sum_assignment(cost)
+        else:
+            rows, cols = range(n), _hungarian_numpy(cost)
+    else:
+        weights = [list(row) for row in weights]
+        cost = [[-w for w in row] + [0.] * n for row in weights]
+        rows, cols = range(n), _hungarian(cost)
+    return [(int(i), int(j)) for i, j in zip(rows, cols)
+            if j < m and weights[i][j] > INELIGIBLE]
+
+
+def assign(players, slots, weights):
+    """ Solves the lineup.
+    Returns: [dict] player full name -> slot and slot -> player full name
+    """
+    best = {}
+    for i, j in solve(weights):
+        best[players[i].name['full']] = slots[j]
+        best[slots[j]] = players[i].name['full']
+    return best
+
+
+def plan(players, slots, rules, schedule):
+    """ Solves the lineups of several days.
+
+    Days where the same players are playing as the day before reuse its
+    lineup. Otherwise the previous day's positions get KEEP_BONUS so that ties
+    are broken in favor of not moving players.
+    - schedule: list of (date, playing_teams)
+    Returns: [OrderedDict] date -> lineup as returned by assign
+    """
+    rules = compile_rules(rules)
+    positions = [pos for pos, _ in slots]
+    out = OrderedDict()
+    previous = None
+    playing_before = None
+    for date, playing_teams in schedule:
+        playing = frozenset(p.nhl_team for p in players if p.nhl_team in playing_teams)
+        if previous is not None and playing == playing_before:
+            out[date] = previous
+            continue
+        weights = build_weights(players, slots, rules, playing_teams)
+        if previous is not None:
+            for i, player in enumerate(players):
+                slot = previous.get(player.name['full'])
+                for j, pos in enumerate(positions):
+                    if slot is not None and pos == slot[0]:
+                        weights[i][j] += KEEP_BONUS
+        previous = assign(players, slots, weights)
+        playing_before = playing
+        out[date] = previous
+    return out
+
+
+class _Assignment:
+    """ Optimal lineup of a weight matrix with its dual potentials, from which
+    the lineup value with one player replaced is computed incrementally.
+
+    The lineup is solved as a square minimum cost problem: rows are the
+    players then one 'empty' row per slot, columns are the slots then one
+    'unassigned' column per player, every pair involving an empty row or an
+    unassigned column costing 0.
+    """
+
+    def __init__(self, weights):
+        n, m = len(weights), len(weights[0])
+        self.n, self.m = n, m
+        self.cost = ([self.player_row(row) for row in weights] +
+                     [[0.] * (n + m) for _ in range(m)])
+        size = n + m
+        self.u = [0.] * (size + 1)
+        self.v = [0.] * (size + 1)
+        self.p = [0] * (size + 1)
+        way = [0] * (size + 1)
+        for i in range(1, size + 1):
+            _phase(self.cost, self.u, self.v, self.p, way, i)
+        self.value = self._value(self.cost, self.p)
+
+    def player_row(self, weights_row):
+        return [-float(w) for w in weights_row] + [0.] * self.n
+
+    @staticmethod
+    def _value(cost, p):
+        return -sum(cost[p[j] - 1][j - 1] for j in range(1, len(p)))
+
+    def replaced_value(self, i, row):
+        """ Lineup value with player i replaced by a player of cost row (see
+        player_row), one augmenting path from the current assignment. """
+        cost = list(self.cost)
+        cost[i] = row
+        u, v, p = list(self.u), list(self.v), list(self.p)
+        p[p.index(i + 1)] = 0
+        _phase(cost, u, v, p, [0] * len(p), i + 1)
+        return self._value(cost, p)
+
+    def row_potentials(self, weights):
+        """ Smallest feasible potential of a player of each row of weights: the
+        lineup with player i replaced by it is worth at most
+        value + u[i] - potential.
+        """
+        v_slots = self.v[1:self.m + 1]
+        free = min(-x for x in self.v[self.m + 1:])
+        if np is not None:
+            weights = np.asarray(weights, dtype=float)
+            return np.minimum((-weights - np.asarray(v_slots)).min(axis=1), free)
+        return [min(min(-w - x for w, x in zip(row, v_slots)), free) for row in weights]
+
+
+def recommend_swaps(players, candidates, slots, rules, schedule, k=10, min_gain=0.):
+    """ Finds the (drop, add) swaps improving the lineups of several days the
+    most, with the weight model of build_weights.
+
+    The lineup of every day is solved once. The gain of each swap is first
+    bounded from the dual potentials of the lineups, for all the swaps at once.
+    The swaps are then evaluated exactly, by replacing one player of the
+    solved lineups, in decreasing order of bound until no remaining swap can
+    enter the top k.
+    - candidates: players that can be added (rank and eligible_positions needed)
+    - schedule: list of (date, playing_teams). Days with the same playing
+                teams are solved once.
+    Returns: [list] of Swap(gain, drop, add), best first
+    """
+    rules = compile_rules(rules)
+    days = Counter(frozenset(playing) for _, playing in schedule)
+    if not players or not candidates or not days:
+        return []
+    bound_drop = [0.] * len(players)
+    bound_add = [0.] * len(candidates)
+    solved = []
+    for playing, count in days.items():
+        assignment = _Assignment(build_weights(players, slots, rules, playing))
+        cand_weights = build_weights(candidates, slots, rules, playing)
+        potentials = assignment.row_potentials(cand_weights)
+        for i in range(len(players)):
+            bound_drop[i] += count * assignment.u[i + 1]
+        for c in range(len(candidates)):
+            bound_add[c] -= count * potentials[c]
+        rows = [assignment.player_row(row) for row in cand_weights]
+        solved.append((assignment, rows, count))
+
+    bounds = [(bound_drop[i] + bound_add[c], i, c)
+              for i in range(len(players)) for c in range(len(candidates))]
+    bounds.sort(reverse=True)
+    best = []
+    for bound, i, c in bounds:
+        if bound <= min_gain or (len(best) == k and bound <= best[0][0]):
+            break
+        gain = sum(count * (assignment.replaced_value(i, rows[c]) - assignment.value)
+                   for assignment, rows, count in solved)
+        if gain > min_gain:
+            item = (gain, -i, -c)
+            if len(best) < k:
+                heapq.heappush(best, item)
+            elif item > best[0]:
+                heapq.heapreplace(best, item)
+    return [Swap(gain, players[-i], candidates[-c])
+            for gain, i, c in sorted(best, reverse=True)]
@@ -0,0 +1,123 @@
+"""
+Columnar container for large sets of players (league-wide rosters, free agent
+pools). Each attribute is stored in its own column instead of one object per
+player, which keeps memory low and makes filtering a single pass per column.
+"""
+from __future__ import absolute_import
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Value used in the rank column for players without a rank
+NO_RANK = -1
+
+
+class PlayerTable:
+    """ Columns of players.
+    - player_key, name (full name), position, eligible_positions (tuple),
+      nhl_team, status, selected_position, team_key: lists
+    - rank: list of int (NO_RANK if unknown)
+
+    Build it with from_records (PlayerRecord from xml_stream) or from_players.
+    """
+    COLUMNS = ('player_key', 'name', 'position', 'eligible_positions', 'nhl_team',
+               'status', 'selected_position', 'rank', 'team_key')
+
+    def __init__(self, columns=None):
+        columns = columns or dict()
+        for col in self.COLUMNS:
+            setattr(self, col, list(columns.get(col, [])))
+
+    @classmethod
+    def from_records(cls, records, team_key=None):
+        table = cls()
+        table.extend(records, team_key)
+        return table
+
+    @classmethod
+    def from_players(cls, players, team_key=None):
+        """ Builds a table from Player objects (their rank if fetched). """
+        return cls.from_records(players, team_key)
+
+    def extend(self, records, team_key=None):
+        """ Appends PlayerRecord (or Player) objects, optionally from team_key. """
+        for r in records:
+            self.player_key.append(r.player_key)
+            self.name.append(r.name.get('full'))
+            self.position.append(r.position)
+            self.eligible_positions.append(tuple(r.eligible_positions))
+            self.nhl_team.append(r.nhl_team)
+            self.status.append(r.status)
+            self.selected_position.append(r.selected_position)
+            self.rank.append(NO_RANK if r.rank is None else r.rank)
+            self.team_key.append(team_key)
+
+    def set_ranks(self, ranks):
+        """ Fills the rank column from a dict player_key: rank. """
+        self.rank = [ranks.get(k, r) for k, r in zip(self.player_key, self.rank)]
+
+    def column(self, name):
+        """ Returns a column as a numpy array if numpy is available. """
+        col = getattr(self, name)
+        if np is None:
+            return list(col)
+        return np.array(col) if name != 'eligible_positions' else np.array(col, dtype=object)
+
+    def mask(self, status=None, eligible=None, nhl_team=None, team_key=None,
+             max_rank=None):
+        """ Returns a list of bool selecting the players matching every condition.
+        - status, nhl_team, team_key: value or list of accepted values
+        - eligible: position (or list of positions) the player must be eligible at
+        - max_rank: maximum rank (players without rank are excluded)
+        """
+        out = [True] * len(self)
+
+        def accept(col, values):
+            values = set(values) if isinstance(values, (list, tuple, set)) else {values}
+            return [m and v in values for m, v in zip(out, col)]
+
+        if status is not None:
+            out = accept(self.status, status)
+        if nhl_team is not None:
+            out = accept(self.nhl_team, nhl_team)
+        if team_key is not None:
+            out = accept(self.team_key, team_key)
+        if eligible is not None:
+            eligible = set(eligible) if isinstance(eligible, (list, tuple, set)) else {eligible}
+            out = [m and not eligible.isdisjoint(e)
+                   for m, e in zip(out, self.eligible_positions)]
+        if max_rank is not None:
+            out = [m and NO_RANK < r <= max_rank for m, r in zip(out, self.rank)]
+        return out
+
+    def where(self, mask):
+        """ Returns a new table with the rows where mask is True. """
+        return PlayerTable(dict(
+            (col, [v for v, m in zip(getattr(self, col), mask) if m])
+            for col in self.COLUMNS))
+
+    def filter(self, **conditions):
+        """ Returns a new table with the players matching the conditions of mask. """
+        return self.where(self.mask(**conditions))
+
+    def sort_by(self, col, reverse=False):
+        """ Returns a new table sorted by a column. """
+        order = sorted(range(len(self)), key=getattr(self, col).__getitem__,
+                       reverse=reverse)
+        return PlayerTable(dict((c, [getattr(self, c)[i] for i in order])
+                                for c in self.COLUMNS))
+
+    def row(self, i):
+        """ Returns the i-th player as a dict. """
+        return dict((col, getattr(self, col)[i]) for col in self.COLUMNS)
+
+    def __len__(self):
+        return len(self.player_key)
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self)))
+
+    def __repr__(self):
+        return '<PlayerTable: {} players>'.format(len(self))
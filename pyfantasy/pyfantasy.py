@@ -13,11 +13,27 @@ TODO:
 from __future__ import absolute_import
 
 from .yahoo_oauth import OAuth2
-from .rule_parser import rule_parser
+from .throttle import Throttle, THROTTLED
+from .coalesce import Batch, Coalescer, Result
+from .instrument import Instruments, RequestEvent, NO_INSTRUMENTS, timed, url_template
+from .utils import json_get_data, json_write_data
+from .schedule import as_date
+from . import xml_stream
+from .xml_stream import PlayerRecord, player_from_dict, rank_from_pick
 from xmltodict import parse
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError
+import os
 import time
+import weakref
+import threading
 from datetime import datetime, date, timedelta
-from collections import Counter, namedtuple, OrderedDict
+from collections import Counter, namedtuple, OrderedDict, deque
+
+try:
+    basestring
+except NameError:
+    basestring = str
 
 try:
     from multiprocessing.pool import ThreadPool
@@ -25,6 +41,31 @@ try:
 except ImportError:
     threads = False
 
+# Maximum number of keys Yahoo accepts in a single collection call
+MAX_KEYS = 25
+
+# Display names of the stats whose values are not integers. Yahoo's settings
+# don't give the type of the stats: the other stats are read as integers, with
+# the stats whose name has a % (see League._get_league_settings)
+FLOAT_STATS = {'GAA', 'SV%', 'FW%', 'SH%', 'AVG', 'OBP', 'SLG', 'OPS', 'ERA', 'WHIP',
+               'K/9', 'K/BB', 'FG%', 'FT%', '3PT%', 'TOI/G'}
+
+
+def _chunks(seq, size):
+    """ Splits a sequence in lists of at most `size' elements. """
+    seq = list(seq)
+    return [seq[i:i + size] for i in range(0, len(seq), size)]
+
+
+def _as_list(x):
+    """ xmltodict returns a single element instead of a list of one. """
+    return x if isinstance(x, list) else [x]
+
+
+def _parse_rank(draft_analysis):
+    """ Returns the rank from a draft_analysis dict (700 if never drafted). """
+    return rank_from_pick(draft_analysis['average_pick'])
+
 
 class Connection:
     """ Instantiation of the API communication and retrieve basic fantasy team info
@@ -33,45 +74,268 @@ class Connection:
                 yahoo_oauth package.
     - game_key: Yahoo's key for the sport/year (should only use nhl for now).
                 For current year teams, can use `nhl'
+    - cache: optional ResponseCache used to avoid refetching slow changing resources
+    - max_workers: size of the worker pool and of the HTTP connection pool shared
+                   by every object created from this connection
+    - throttle: Throttle limiting the request rate and retrying throttled or
+                failed requests (retries only by default)
+    - hooks: callables receiving the instrumentation events of every request
+             and of the expensive steps (see instrument). More can be added
+             later with connection.instruments.add(hook)
+    - transport: RecordingTransport or ReplayTransport (see transport) to save
+                 the responses or to work offline from the saved ones. A
+                 replay transport needs no credentials (filepath can be None)
+    - coalesce_window: if set, gets of single players, teams and leagues made
+                       by concurrent threads within this many seconds are sent
+                       as one collection call (see coalesce)
+    - schedule: Schedule of the season (see schedule), used by the Team methods
+                when no playing teams are given
+    - snapshot: SettingsSnapshot the league settings are read from and saved
+                to, so that they are only fetched once
+
+    The connection can be used as a context manager to release the pools.
+    The League and Team objects it creates are kept in a weak identity map, so
+    asking again for the same key returns the same object without any call.
     """
 
-    def __init__(self, filepath, game_key='nhl'):
+    def __init__(self, filepath, game_key='nhl', cache=None, max_workers=20,
+                 throttle=None, hooks=None, transport=None, coalesce_window=None,
+                 schedule=None, snapshot=None):
         self.credentials_path = filepath
-        self.login(filepath)
+        self.max_workers = max_workers
+        self.throttle = Throttle() if throttle is None else throttle
+        self.instruments = Instruments(hooks)
+        self.transport = transport
+        self.schedule = schedule
+        self.snapshot = snapshot
+        self._pool = None
+        self._coalescer = None
+        if coalesce_window:
+            self._coalescer = Coalescer(self, coalesce_window, MAX_KEYS)
+        # Identical requests in flight are only sent once
+        self._inflight = dict()
+        self._inflight_lock = threading.Lock()
+        self._leagues = weakref.WeakValueDictionary()
+        self._teams = weakref.WeakValueDictionary()
+        self.oauth = None
+        if transport is not None:
+            transport.attach(self)
+        if transport is None or not transport.offline:
+            self.login(filepath)
         self.game_key = game_key
+        self.cache = cache
 
     def login(self, filepath):
         self.oauth = OAuth2(None, None, from_file=filepath)
-
-    def get(self, url):
-        """ Retrieves API info and parses it.
-        Returns: [dict] parsed data
+        # One pooled HTTP connection per worker
+        adapter = HTTPAdapter(pool_connections=self.max_workers,
+                              pool_maxsize=self.max_workers)
+        self.oauth.session.mount('https://', adapter)
+
+    @property
+    def session(self):
+        """ Session sending the requests: the transport if any, else the
+        authenticated session. """
+        if self.transport is not None:
+            return self.transport
+        return self.oauth.session
+
+    def map(self, func, iterable):
+        """ Applies func to every element using the connection's worker pool.
+        Returns: [list] results in order
+        """
+        iterable = list(iterable)
+        if not threads or len(iterable) < 2:
+            return [func(x) for x in iterable]
+        return self._get_pool().map(func, iterable)
+
+    def submit(self, func, *args):
+        """ Runs func(*args) in the connection's worker pool.
+        Returns: [Result] whose result() waits for the call and returns its value
         """
-        # remove url prefix to avoid duplicate
+        result = Result()
+
+        def run():
+            try:
+                result.set(func(*args))
+            except Exception as e:
+                result.fail(e)
+
+        if threads:
+            self._get_pool().apply_async(run)
+        else:
+            run()
+        return result
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(self.max_workers)
+        return self._pool
+
+    def close(self):
+        """ Shuts down the worker pool and the HTTP connections. """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self.transport is not None:
+            self.transport.close()
+        if self.oauth is not None:
+            self.oauth.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _strip_url(url):
+        """ Removes the url prefix to avoid duplicates. """
         url = url.lstrip('/')
         start_check = 'fantasy/v2/'
         if url.startswith(start_check):
             url = url[len(start_check):]
+        return url
 
-        # REQUESTS
-        base_url = 'https://fantasysports.yahooapis.com/fantasy/v2/'
-        r = self.oauth.session.get(base_url + url)
-
-        # If the requests is refused, try to reconnect and retry
-        if r.status_code in [401, 403]:
-            self.login(self.credentials_path)
-            r = self.oauth.session.get(base_url + url)
-
-        # If the request is still refused, raise error!
-        r.raise_for_status()
+    def get(self, url):
+        """ Retrieves API info and parses it.
+        Returns: [dict] parsed data
+        """
+        url = self._strip_url(url)
+        if self._coalescer is not None:
+            return self._coalescer.get(url)
+        return self._get(url)
+
+    def _get(self, url, cache=True):
+        """ get without coalescing, of a stripped url. """
+        return self._fetch(url, url if cache else None,
+                           lambda r: parse(r.text)['fantasy_content'])
+
+    def batch(self):
+        """ Returns a Batch (see coalesce): its gets are sent when it is closed,
+        those of single players, teams or leagues as collection calls.
+
+            with conn.batch() as batch:
+                results = [batch.get(url) for url in urls]
+            data = [r.result() for r in results]
+        """
+        return Batch(self, MAX_KEYS)
 
-        return parse(r.text)['fantasy_content']
+    def stream(self, url, extractor):
+        """ Retrieves API info and parses it with one of the streaming extractors
+        of xml_stream, without building the whole document.
+        Returns: [list] records yielded by the extractor
+        """
+        url = self._strip_url(url)
+        key = '{}#{}'.format(url, extractor.__name__)
+        return self._fetch(url, key, lambda r: list(extractor(r.content)))
+
+    def _cached(self, url, key):
+        """ Returns the cached data of key (None if missing). """
+        data = self.cache.get(key)
+        if data is not None and self.instruments.hooks:
+            self.instruments.emit(RequestEvent(
+                url, url_template(url), None, 0, 0., 0., True, 0))
+        return data
+
+    def _fetch(self, url, key, parse_response):
+        """ Returns the cached data of key, else requests url and parses the
+        response with parse_response, emitting a RequestEvent to the hooks.
+        - key: cache key, None to bypass the cache
+        Concurrent calls of the same key (url if None) share the same request.
+        """
+        if key is not None and self.cache is not None:
+            data = self._cached(url, key)
+            if data is not None:
+                return data
+
+        flight_key = url if key is None else key
+        with self._inflight_lock:
+            flight = self._inflight.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[flight_key] = Result()
+        if not leader:
+            return flight.result()
+        try:
+            data = self._send(url, key, parse_response)
+        except Exception as e:
+            flight.fail(e)
+            raise
+        else:
+            flight.set(data)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[flight_key]
+        return data
+
+    def _send(self, url, key, parse_response):
+        hooks = self.instruments.hooks
+        r, retries, network_time = self._request(url)
+        start = time.time()
+        try:
+            # If the request is still refused, raise error!
+            if r.status_code in THROTTLED:
+                raise HTTPError('{} Throttled: {}'.format(r.status_code, url), response=r)
+            r.raise_for_status()
+            data = parse_response(r)
+        finally:
+            if hooks:
+                self.instruments.emit(RequestEvent(
+                    url, url_template(url), r.status_code, len(r.content), network_time,
+                    time.time() - start, False, retries))
+        if key is not None and self.cache is not None:
+            self.cache.set(key, data)
+        return data
+
+    def _request(self, url):
+        """ Sends a rate limited GET request, retrying it when throttled.
+        Returns: [tuple] response, number of retries, time spent waiting for
+                 the responses
+        """
+        base_url = 'https://fantasysports.yahooapis.com/fantasy/v2/'
+        attempt = 0
+        network_time = 0.
+        oauth = self.oauth
+        session = self.session
+        while True:
+            self.throttle.acquire()
+            token = None
+            if oauth is not None:
+                oauth.ensure_valid()
+                token = oauth.access_token
+            start = time.time()
+            r = session.get(base_url + url)
+
+            # If the requests is refused, refresh the token and retry
+            if r.status_code in [401, 403] and oauth is not None:
+                oauth.refresh(token)
+                r = session.get(base_url + url)
+            network_time += time.time() - start
+
+            delay = self.throttle.retry_delay(r.status_code, r.headers, attempt)
+            if delay is None:
+                return r, attempt, network_time
+            time.sleep(delay)
+            attempt += 1
+
+    def invalidate(self, prefix='', exact=False):
+        """ Removes the cached responses whose url starts with prefix.
+        - exact: only remove the response of the url prefix itself
+        """
+        if self.cache is None:
+            return
+        if exact:
+            self.cache.delete(prefix)
+        else:
+            self.cache.invalidate(prefix)
 
     def raw_get(self, url):
         """ Retrieves API info.
         Returns: raw text response
         """
-        return self.oauth.session.get(url)
+        return self.session.get(url)
 
     def user_info(self):
         """ Retrieves current user teams' name and team_key.
@@ -110,28 +374,178 @@ class Connection:
 
         return teams
 
+    def get_ranks(self, player_keys):
+        """ Retrieves the draft rank of many players at once using the players
+        collection resource (MAX_KEYS players per call).
+        Returns: [dict] player_key: rank
+        """
+        urls = ['players;player_keys={}/draft_analysis'.format(','.join(chunk))
+                for chunk in _chunks(player_keys, MAX_KEYS)]
+        ranks = {}
+        for records in self.map(lambda url: self.stream(url, xml_stream.iter_ranks), urls):
+            ranks.update(records)
+        return ranks
+
+    def load_teams(self, team_keys, get_rank=False):
+        """ Builds many teams with the teams and leagues collection resources
+        (MAX_KEYS keys per call), the calls running concurrently on the pool.
+        Teams of the same league share their League.
+        Returns: [list] Team objects in the order of team_keys
+        """
+        leagues = dict((k, self._leagues.get(k)) for k in
+                       set(k[:k.rfind('.') - 2] for k in team_keys))
+        if self.snapshot is not None:
+            for k, v in leagues.items():
+                if v is None and self.snapshot.get(k) is not None:
+                    leagues[k] = self.get_league(k)
+        league_keys = sorted(k for k, v in leagues.items() if v is None)
+        jobs = [('teams;team_keys={}/roster'.format(','.join(chunk)), True)
+                for chunk in _chunks(team_keys, MAX_KEYS)]
+        jobs += [('leagues;league_keys={}/settings'.format(','.join(chunk)), False)
+                 for chunk in _chunks(league_keys, MAX_KEYS)]
+
+        def fetch(job):
+            url, roster = job
+            return self.stream(url, xml_stream.iter_rosters) if roster else self.get(url)
+
+        rosters = {}
+        for (url, roster), res in zip(jobs, self.map(fetch, jobs)):
+            if roster:
+                rosters.update((r.team_key, r) for r in res)
+            else:
+                for x in _as_list(res['leagues']['league']):
+                    league = League(x['league_key'], self, settings={'league': x})
+                    leagues[x['league_key']] = self._leagues.setdefault(
+                        x['league_key'], league)
+
+        # ranks of the new teams if get_rank, and of the teams already wanting them
+        ranked = set(k for k in team_keys if get_rank or
+                     getattr(self._teams.get(k), '_get_rank', False))
+        ranks = dict()
+        if ranked:
+            ranks = self.get_ranks([p.player_key for k in team_keys if k in ranked
+                                    for p in rosters[k].players])
+        return [self._team_from_roster(key, rosters[key], leagues[key[:key.rfind('.') - 2]],
+                                       ranks if key in ranked else None)
+                for key in team_keys]
+
+    def _team_from_roster(self, team_key, roster, league, ranks=None):
+        """ Returns the Team of the identity map with the given roster, building
+        it if needed: callers holding the team see the new roster.
+        - ranks: dict player_key: rank of the roster players, if wanted
+        """
+        team = self._teams.get(team_key)
+        if team is None:
+            team = self._teams.setdefault(team_key, Team(team_key, self, league=league))
+        if team._league is None:
+            team._league = league
+        team._get_roster(team_key, roster, ranks)
+        return team
+
     def get_team(self, team_key, get_rank=False):
-        return Team(team_key, self, get_rank)
+        team = self._teams.get(team_key)
+        if team is None:
+            team = self._teams.setdefault(team_key, Team(team_key, self, get_rank))
+        elif get_rank and not team._ranked:
+            if team._players is None:
+                team._get_rank = True
+            else:
+                team._get_ranks()
+        return team
+
+    def get_league(self, league_key):
+        league = self._leagues.get(league_key)
+        if league is None:
+            league = self._leagues.setdefault(league_key, League(league_key, self))
+        return league
+
+
+class TransactionCursor:
+    """ High-water marks of League.new_transactions, persisted in a json file.
+    Can be shared by threads.
+    - filepath: path of the json file (created on the first save)
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.marks = json_get_data(filepath) if os.path.exists(filepath) else dict()
+        self._lock = threading.RLock()
 
-    def get_league(self, league_key, child=None):
-        return League(league_key, self, child)
+    def get(self, league_key):
+        """ Returns the last transaction_id seen in the league, None if none. """
+        mark = self.marks.get(league_key)
+        return None if mark is None else mark['transaction_id']
+
+    def set(self, league_key, transaction_id, timestamp):
+        with self._lock:
+            self.marks[league_key] = {'transaction_id': transaction_id,
+                                      'timestamp': timestamp.isoformat()}
+            self.save()
+
+    def save(self):
+        with self._lock:
+            json_write_data(self.marks, self.filepath)
+
+
+class SettingsSnapshot:
+    """ League settings persisted in a json file, so that the next runs build
+    their leagues without any call. The settings of a league are kept until
+    invalidated: they rarely change during a season. Can be shared by threads.
+    - filepath: path of the json file (created on the first save)
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.settings = json_get_data(filepath) if os.path.exists(filepath) else dict()
+        self._lock = threading.RLock()
+
+    def get(self, league_key):
+        """ Returns the settings response of the league, None if not saved. """
+        return self.settings.get(league_key)
+
+    def set(self, league_key, settings):
+        with self._lock:
+            if self.settings.get(league_key) != settings:
+                self.settings[league_key] = settings
+                self.save()
+
+    def invalidate(self, league_key=None):
+        """ Forgets the settings of a league (of every league by default). """
+        with self._lock:
+            if league_key is None:
+                self.settings.clear()
+            else:
+                self.settings.pop(league_key, None)
+            self.save()
+
+    def save(self):
+        with self._lock:
+            json_write_data(self.settings, self.filepath)
 
 
 class League:
     """
     League class. Contains methods with actions that are league-specific
-    but not team-specific
+    but not team-specific. A League is shared by the teams of the connection
+    in it, see Team.get_scoreboard for the matchup of a team.
     """
 
-    def __init__(self, league_key, parent, child=None):
+    def __init__(self, league_key, parent, settings=None):
         self.parent = parent
-        self.team = child
         self.get = parent.get
         self.league_key = league_key
-        self._get_league_settings()
-
-    def _get_league_settings(self):
-        settings = self.get('league/{}/settings'.format(self.league_key))
+        self._get_league_settings(settings)
+
+    def _get_league_settings(self, settings=None):
+        """ Parses the league settings, taken from the connection's snapshot or
+        fetched if not given. """
+        snapshot = getattr(self.parent, 'snapshot', None)
+        if settings is None and snapshot is not None:
+            settings = snapshot.get(self.league_key)
+        if settings is None:
+            settings = self.get('league/{}/settings'.format(self.league_key))
+        if snapshot is not None:
+            snapshot.set(self.league_key, settings)
         self.league_type = settings['league']['scoring_type']
         self.name = settings['league']['name']
         roster_list = (settings['league']['settings']['roster_positions']
@@ -139,9 +553,33 @@ class League:
         self.roster_positions = [x['position'] for x in roster_list
                                  for n in range(int(x['count']))]
         self.stats = OrderedDict()
+        # int or float converter of each stat, resolved once per league from the
+        # display names and never changed after: the league is shared by threads
+        self._stat_types = dict()
         for s in settings['league']['settings']['stat_categories']['stats']['stat']:
             self.stats[s['stat_id']] = (s['display_name'],
                                         s.get('is_only_display_stat', 0) != '1')
+            is_float = s['display_name'] in FLOAT_STATS or '%' in s['display_name']
+            self._stat_types[s['stat_id']] = float if is_float else int
+
+    def _convert_stat(self, stat_id, value):
+        """ Converts a stat value with the type of the stat (None if missing).
+        A value of an integer stat that is not an integer (a float stat missing
+        from FLOAT_STATS) is returned as float. """
+        if value is None or value in ('-', ''):
+            return None
+        try:
+            return self._stat_types.get(stat_id, int)(value)
+        except ValueError:
+            return float(value)
+
+    def _team_stats(self, out, stats):
+        """ Adds the (stat_id, value) stats to the out dict by display name. """
+        for stat_id, value in stats:
+            name, shown = self.stats[stat_id]
+            if shown:
+                out[name] = self._convert_stat(stat_id, value)
+        return out
 
     def get_standings(self):
         """ Get fantasy standing data
@@ -156,57 +594,44 @@ class League:
         TODO: Adjust rankings for H2H and Rotisserie
         """
         url = 'league/{}/standings'.format(self.league_key)
-        r = self.get(url)
         out = []
-        for x in r['league']['standings']['teams']['team']:
+        for x in self.parent.stream(url, xml_stream.iter_team_stats):
             team = OrderedDict()
-            team['rank'] = int(x['team_standings']['rank'])
-            team['team_name'] = x['name']
+            team['rank'] = x.rank
+            team['team_name'] = x.name
             if self.league_type == 'head':
-                team['records'] = (int(x['team_standings']['outcome_totals']['wins']),
-                                   int(x['team_standings']['outcome_totals']['losses']),
-                                   int(x['team_standings']['outcome_totals']['ties']))
-            team['totals'] = float(x['team_points']['total'])
-            for s in x['team_stats']['stats']['stat']:
-                stat_key = self.stats[s['stat_id']]
-                if stat_key[1]:
-                    try:
-                        team[stat_key[0]] = int(s['value'])
-                    except ValueError:
-                        team[stat_key[0]] = float(s['value'])
+                team['records'] = x.outcome
+            team['totals'] = float(x.points_total)
+            self._team_stats(team, x.stats)
 
             if self.league_type == 'roto':
-                team['points_change'] = x['team_standings'].get('points_change', 'N/A')
-            team['owner'] = x['managers']['manager']['nickname']
+                team['points_change'] = x.points_change or 'N/A'
+            team['owner'] = x.owner
 
             out.append(team)
 
         return out
 
-    def get_scoreboard(self):
-        """
+    def get_scoreboard(self, team=None):
+        """ Get the matchups of the current week.
+        - team: Team whose matchup is put first, the matchups are in the order
+                of the league if not given
 
         :return:
         """
+        own_name = team.name if team is not None else None
         url = 'league/{}/scoreboard'.format(self.league_key)
-        r = self.get(url)
         matchups = []
-        for x in r['league']['scoreboard']['matchups']['matchup']:
+        for week, teams in self.parent.stream(url, xml_stream.iter_matchups):
             own = False
             matchup = []
-            for team in x['teams']['team']:
+            for team in teams:
                 team_stat = OrderedDict()
-                team_stat['team'] = team['name']
-                if team['name'] == self.team.name:
+                team_stat['team'] = team.name
+                if team.name == own_name:
                     own = True
-                team_stat['total'] = team['team_points']['total']
-                for s in team['team_stats']['stats']['stat']:
-                    stat_key = self.stats[s['stat_id']]
-                    if stat_key[1]:
-                        try:
-                            team_stat[stat_key[0]] = int(s['value'])
-                        except ValueError:
-                            team_stat[stat_key[0]] = float(s['value'])
+                team_stat['total'] = team.points_total
+                self._team_stats(team_stat, team.stats)
                 matchup.append(team_stat)
             if own:
                 matchups.insert(0, matchup)
@@ -215,35 +640,155 @@ class League:
 
         return matchups
 
+    def get_scoreboards(self, weeks):
+        """ Get the matchups of several weeks in one call, in columns.
+
+        One row per team and week. Columns are week, matchup (index of the
+        matchup in the week), team_key, team_name, total and one column per
+        stat of the league (display name), missing values being NaN.
+
+        :return: OrderedDict column name -> numpy array (list without numpy)
+        """
+        url = 'league/{}/scoreboard;week={}'.format(
+            self.league_key, ','.join(str(w) for w in weeks))
+        stat_ids = [k for k, (name, shown) in self.stats.items() if shown]
+        columns = OrderedDict((c, []) for c in ('week', 'matchup', 'team_key',
+                                                'team_name', 'total'))
+        values = dict((k, []) for k in stat_ids)
+        n_matchup = Counter()
+        for week, teams in self.parent.stream(url, xml_stream.iter_matchups):
+            for team in teams:
+                columns['week'].append(week)
+                columns['matchup'].append(n_matchup[week])
+                columns['team_key'].append(team.team_key)
+                columns['team_name'].append(team.name)
+                columns['total'].append(float(team.points_total or 'nan'))
+                stats = dict(team.stats)
+                for k in stat_ids:
+                    value = self._convert_stat(k, stats.get(k))
+                    values[k].append(float('nan') if value is None else value)
+            n_matchup[week] += 1
+        for k in stat_ids:
+            columns[self.stats[k][0]] = values[k]
+        try:
+            import numpy as np
+        except ImportError:
+            return columns
+        for name, col in columns.items():
+            columns[name] = np.array(col)
+        return columns
+
+    def iter_players(self, status='A', position=None, sort=None, ranks=False,
+                     page_size=25, prefetch=4, limit=None):
+        """ Generator of the players of the league pool, as PlayerRecord (see
+        xml_stream; PlayerTable.from_records builds a table of them).
+
+        The next pages are retrieved concurrently in the connection's pool
+        while the current one is consumed, at most prefetch pages at a time.
+        - status: A (available), FA (free agents), W (waivers), T (taken), K (keepers)
+        - position: e.g. C, D, G
+        - sort: e.g. AR (actual rank), OR (original rank), PTS, or a stat_id
+        - ranks: fills the rank of the records from the draft analysis, in the
+                 same calls
+        - limit: maximum number of players
+        """
+        params = ''.join(';{}={}'.format(k, v) for k, v in (
+            ('status', status), ('position', position), ('sort', sort)) if v is not None)
+        sub = '/draft_analysis' if ranks else ''
+
+        def page(start, count):
+            url = 'league/{}/players{};start={};count={}{}'.format(
+                self.league_key, params, start, count, sub)
+            return self.parent.stream(url, xml_stream.iter_players)
+
+        pending = deque()
+        start = 0
+        while True:
+            # a page ending the pool ends the scan, the pages requested after it are dropped
+            while len(pending) < prefetch and (limit is None or start < limit):
+                count = page_size if limit is None else min(page_size, limit - start)
+                pending.append((count, self.parent.submit(page, start, count)))
+                start += count
+            if not pending:
+                return
+            count, result = pending.popleft()
+            records = result.result()
+            for record in records:
+                yield record
+            if len(records) < count:
+                return
+
     def get_transactions(self):
         """ Get transactions that occurred in the past day.
-        Maximum number of transactions per call is 30
         Returns a list of dictionary suitable to create a DataFrame. """
-        url = 'league/{}/transactions;count=30'.format(self.league_key)
-        data = self.get(url)
-        res = []
-        yesterday = date.today() - timedelta(days=1)
-        for tr in data['league']['transactions']['transaction']:
-            ts = datetime.fromtimestamp(int(tr['timestamp']))
-            if ts.date() >= yesterday:
-                player_list = tr.get('players', dict()).get('player', [])
-                if int(tr.get('players', dict()).get('@count', 0)) == 1:
-                    player_list = [player_list]
-                for player in player_list:
-                    out = dict()
-                    out['transaction_id'] = tr['transaction_id']
-                    out['timestamp'] = ts
-                    out['type'] = player['transaction_data']['type']
-                    out['source_type'] = player['transaction_data']['source_type']
-                    out['source_team'] = player['transaction_data'].get(
-                        'source_team_name', 'N/A')
-                    out['destination_type'] = (player['transaction_data']
-                                               ['destination_type'])
-                    out['destination_team'] = player['transaction_data'].get(
-                        'destination_team_name', 'N/A')
-                    out['player_name'] = player['name']['full']
-                    res.append(out)
-        return res
+        yesterday = datetime.combine(date.today() - timedelta(days=1), datetime.min.time())
+        return list(self.iter_transactions(until=yesterday))
+
+    def iter_transactions(self, since=None, until=None, page_size=25, first_page=5):
+        """ Generator of the league transactions, newest first, one dictionary
+        per player moved (see get_transactions). Pages are only retrieved as
+        the generator is consumed.
+        - since: transaction_id high-water mark, stops at it (excluded)
+        - until: datetime, stops at the transactions older than it
+        - page_size: number of transactions per call
+        - first_page: size of the first call, small so that a poll without new
+                      transactions stays cheap
+        """
+        start = 0
+        count = first_page
+        seen = set()
+        while True:
+            url = 'league/{}/transactions;start={};count={}'.format(
+                self.league_key, start, count)
+            data = self.get(url)['league']['transactions']
+            transactions = _as_list(data.get('transaction', [])) if data else []
+            for tr in transactions:
+                tr_id = int(tr['transaction_id'])
+                ts = datetime.fromtimestamp(int(tr['timestamp']))
+                if (since is not None and tr_id <= since) or \
+                        (until is not None and ts < until):
+                    return
+                # new transactions shift the pages, skip the ones already seen
+                if tr_id in seen:
+                    continue
+                seen.add(tr_id)
+                for row in self._transaction_rows(tr, ts):
+                    yield row
+            if len(transactions) < count:
+                return
+            start += count
+            count = page_size
+
+    def new_transactions(self, cursor):
+        """ Returns the transactions newer than the cursor's high-water mark for
+        this league and moves the mark to the newest one.
+        - cursor: TransactionCursor
+        """
+        rows = list(self.iter_transactions(since=cursor.get(self.league_key)))
+        if rows:
+            newest = max(rows, key=lambda row: int(row['transaction_id']))
+            cursor.set(self.league_key, int(newest['transaction_id']), newest['timestamp'])
+        return rows
+
+    @staticmethod
+    def _transaction_rows(tr, ts):
+        player_list = tr.get('players', dict()).get('player', [])
+        if int(tr.get('players', dict()).get('@count', 0)) == 1:
+            player_list = [player_list]
+        for player in player_list:
+            out = dict()
+            out['transaction_id'] = tr['transaction_id']
+            out['timestamp'] = ts
+            out['type'] = player['transaction_data']['type']
+            out['source_type'] = player['transaction_data']['source_type']
+            out['source_team'] = player['transaction_data'].get(
+                'source_team_name', 'N/A')
+            out['destination_type'] = (player['transaction_data']
+                                       ['destination_type'])
+            out['destination_team'] = player['transaction_data'].get(
+                'destination_team_name', 'N/A')
+            out['player_name'] = player['name']['full']
+            yield out
 
     def __repr__(self):
         return '<League: {} - {}>'.format(self.name, self.league_type)
@@ -256,43 +801,120 @@ class Team:
     - league_key: Yahoo's key for the fantasy league
     - num_players: number of players on the fantasy team
     - players: list of Player objects
-    - data: player raw data in dict form
+    - data: list of the players' PlayerRecord, only kept if keep_raw=True
+    The RosterRecord and the League can be given when already retrieved.
+
+    The roster, the ranks and the league are only retrieved when first used
+    (see prefetch to retrieve them in advance).
     """
 
-    def __init__(self, team_key, parent=None, get_rank=False):
+    def __init__(self, team_key, parent=None, get_rank=False, roster=None, league=None,
+                 keep_raw=False):
         self.team_key = team_key
         self.league_key = team_key[:team_key.rfind('.') - 2]
         self.parent = parent
         self.get = self.parent.get
+        # ranks wanted with the roster, and ranks set on the loaded players
         self._get_rank = get_rank
-        self._get_roster(team_key)
-        self.league = parent.get_league(self.league_key, self)
-
-    def _get_player(self, data):
-        """ Creates and returns a Player object. Allows for threads. """
-        return Player(data, self, rank=self._get_rank)
-
-    def _get_roster(self, team_key):
+        self._ranked = False
+        self._keep_raw = keep_raw
+        self._name = None
+        self._players = None
+        self._league = league
+        self.data = None
+        if roster is not None:
+            self._get_roster(team_key, roster)
+
+    @property
+    def name(self):
+        """ Team name, from the roster if loaded, else from the team metadata. """
+        if self._name is None:
+            self._name = self.get('team/{}'.format(self.team_key))['team']['name']
+        return self._name
+
+    @property
+    def players(self):
+        if self._players is None:
+            self._get_roster(self.team_key)
+        return self._players
+
+    @property
+    def num_players(self):
+        return len(self.players)
+
+    @property
+    def league(self):
+        if self._league is None:
+            self._league = self.parent.get_league(self.league_key)
+        return self._league
+
+    @property
+    def ranks(self):
+        """ dict player_key: rank of the roster """
+        self._get_rank = True
+        self.players
+        if not self._ranked:
+            self._get_ranks()
+        return dict((p.player_key, p.rank) for p in self.players)
+
+    def prefetch(self, *what):
+        """ Retrieves in advance what a workflow will need, concurrently.
+        - what: any of 'roster', 'league' and 'ranks' (all by default)
+        returns: self
+        """
+        what = set(what or ('roster', 'league', 'ranks'))
+        if 'ranks' in what:
+            self._get_rank = True
+        jobs = []
+        if self._players is None and what & {'roster', 'ranks'}:
+            jobs.append(lambda: self.players)
+        elif self._players is not None and 'ranks' in what and not self._ranked:
+            jobs.append(self._get_ranks)
+        if self._league is None and 'league' in what:
+            jobs.append(lambda: self.league)
+        self.parent.map(lambda job: job(), jobs)
+        return self
+
+    @timed('team.roster', 'team_key')
+    def _get_roster(self, team_key, roster=None, ranks=None):
         """ Get fantasy team information and list of players.
-        This function gets called at initialization. """
-        url = 'team/{}/roster'.format(team_key)
-        response = self.get(url)
-        self.name = response['team']['name']
-        data = response['team']['roster']['players']['player']
-        self.num_players = len(data)
-        if threads:
-            pool = ThreadPool(20)
-            func = pool.map
-        else:
-            func = map
-        self.players = func(self._get_player, data)
-        self.data = data
+        This function gets called at the first use of the players.
+        - ranks: dict player_key: rank if already retrieved """
+        if roster is None:
+            url = 'team/{}/roster'.format(team_key)
+            roster = self.parent.stream(url, xml_stream.iter_rosters)[0]
+        self._name = roster.name
+        data = roster.players
+        self._players = [Player(x, self, keep_raw=self._keep_raw) for x in data]
+        self._ranked = False
+        self.data = data if self._keep_raw else None
+        if ranks is not None:
+            self._get_ranks(ranks)
+        elif self._get_rank:
+            self._get_ranks()
+
+    def _get_ranks(self, ranks=None):
+        """ Sets the rank of every player of the roster in batched calls.
+        - ranks: dict player_key: rank if already retrieved
+        """
+        if ranks is None:
+            ranks = self.parent.get_ranks([p.player_key for p in self.players])
+        for player in self.players:
+            player.rank = ranks[player.player_key]
+        self._get_rank = True
+        self._ranked = True
 
-    def update_roster(self, data):
+    @timed('team.update_roster', 'team_key')
+    def update_roster(self, data, day=None, current=None):
         """ Updates the roster with the new alignment.
 
-        Data should be a list of tuples of the form:
-            (Player, old position, new position)
+        Data should be the mapping returned by start_active:
+            player name -> (new position, n)
+        The players missing from data (left unassigned by the solver when the
+        roster has more players than slots) keep their position.
+        - day: date (or 'YYYY-MM-DD') of the alignment, today by default
+        - current: player name -> position the changes are computed from,
+                   defaults to the selected positions of the roster
 
         See: https://developer.yahoo.com/fantasysports/guide/roster-resource.html
         """
@@ -301,9 +923,14 @@ class Team:
         # Elements are tuples of (Player, old position, new position)
         update_data = []
         for player in self.players:
+            if player.name['full'] not in data:
+                continue
             new = data[player.name['full']][0]
-            if player.selected_position != new:
-                update_data.append((player, player.selected_position, new))
+            old = player.selected_position
+            if current is not None:
+                old = current.get(player.name['full'], old)
+            if old != new:
+                update_data.append((player, old, new))
 
         if len(update_data) == 0:
             print('No update to be done!')
@@ -313,7 +940,11 @@ class Team:
         header = ('<?xml version="1.0"?> <fantasy_content> <roster>'
                   '<coverage_type>date</coverage_type>')
         footer = '</roster> </fantasy_content>'
-        date_str = '<date>{}</date>'.format(time.strftime("%Y-%m-%d"))
+        if day is None:
+            day = time.strftime("%Y-%m-%d")
+        elif not isinstance(day, basestring):
+            day = day.strftime("%Y-%m-%d")
+        date_str = '<date>{}</date>'.format(day)
         players_str = '<players>'
         for player, old_pos, new_pos in update_data:
             players_str += ('<player> <player_key>{}</player_key> <position>{}'
@@ -322,114 +953,183 @@ class Team:
         msg = '{} {} {} {}'.format(header, date_str, players_str, footer)
         url = ('https://fantasysports.yahooapis.com/fantasy/v2/team/'
                '{}/roster'.format(self.team_key))
-        r = self.parent.oauth.session.put(url,
-                                          msg,
-                                          headers={'content-type': 'application/xml'})
+        r = self.parent.session.put(url,
+                                    msg,
+                                    headers={'content-type': 'application/xml'})
         if r.status_code != 200:
             print(r.text)
         r.raise_for_status()
+        # 'team/{key}' alone would also match the teams whose key extends it
+        self.parent.invalidate('team/{}'.format(self.team_key), exact=True)
+        self.parent.invalidate('team/{}/'.format(self.team_key))
+        self.parent.invalidate('team/{}#'.format(self.team_key))
+        self.parent.invalidate('teams;')
         return r
 
-    def start_active(self, rules, playing_teams):
+    def _schedule(self, schedule=None):
+        """ Returns schedule, else the schedule of the connection. """
+        if schedule is None:
+            schedule = getattr(self.parent, 'schedule', None)
+        if schedule is None:
+            raise ValueError('No schedule given and no schedule on the connection')
+        return schedule
+
+    @staticmethod
+    def _dates(schedule, start=None, end=None):
+        """ Returns the sorted dates of schedule between start and end (included).
+        Bounds given as 'YYYY-MM-DD' or datetime are compared as dates. """
+        def bound(day):
+            return as_date(day) if isinstance(day, (basestring, datetime)) else day
+        start, end = bound(start), bound(end)
+        return [d for d in sorted(schedule)
+                if (start is None or d >= start) and (end is None or d <= end)]
+
+    def start_active(self, rules, playing_teams=None, day=None):
         """ Create an optimal assignment between players and positions.
 
-        Takes the list of player and creates a weighted bipartite graph.
-        The weights are inversely proportional to the player's rank except if:
+        Builds a players x positions weight matrix. The weights are inversely
+        proportional to the player's rank, modified by the rules, e.g. if
         (a) the player is injured (weight=1) or (b) the player is not playing
-        (weight=2). Then, using the networkx package, the graph is analyzed with
-        a maximum weighted matching algorithm. Finally, calls the update_roster
-        method to update the alignment.
+        (weight=2). The matrix is then solved as a maximum weight assignment
+        (see lineup). The result can be given to the update_roster method to
+        update the alignment.
+        - rules: list of rules (see rule.json) or rule_parser.compile_rules(rules)
+        - playing_teams: NHL teams playing on that day. If not given, they are
+                         taken from the connection's schedule for day
+        - day: date (or 'YYYY-MM-DD') of the lineup, today by default
 
-        returns: [list] list of changes to the roster
+        returns: [dict] player name -> (position, n) and (position, n) -> player name
 
         TODO: Add IR spots, and add message to email saying that there is a free
             spot in the team.
         """
-        try:
-            import networkx as nx
-        except ImportError:
-            raise ImportError('Could not import package networkx. This package is '
-                              'necessary to compute the optimal allocation.')
-
+        from . import lineup
         # rank is necessary
-        if not self._get_rank:
-            self._get_rank = True
-            self._get_roster(self.team_key)
+        if not self._ranked:
+            self._get_ranks()
+        if playing_teams is None:
+            playing_teams = self._schedule().playing(day or time.strftime('%Y-%m-%d'))
+
+        slots = lineup.roster_slots(self.league.roster_positions)
+        instruments = getattr(self.parent, 'instruments', NO_INSTRUMENTS)
+        with instruments.span('lineup.build', team_key=self.team_key):
+            weights = lineup.build_weights(self.players, slots, rules, playing_teams)
+        with instruments.span('lineup.solve', team_key=self.team_key):
+            return lineup.assign(self.players, slots, weights)
+
+    def plan_lineups(self, rules, schedule=None, start=None, end=None):
+        """ Computes the optimal lineups of several days in one batch.
+
+        The roster, the ranks and the compiled rules are reused for every day,
+        and each day is solved starting from the previous day's lineup.
+        - rules: list of rules or compiled rules (see start_active)
+        - schedule: Schedule or dict date -> NHL teams playing on that date,
+                    the connection's schedule by default
+        - start, end: optional bounds of the dates to plan (included)
+
+        returns: [OrderedDict] date -> lineup as returned by start_active
+        """
+        from . import lineup
+        if not self._ranked:
+            self._get_ranks()
+        schedule = self._schedule(schedule)
+        dates = self._dates(schedule, start, end)
+        slots = lineup.roster_slots(self.league.roster_positions)
+        return lineup.plan(self.players, slots, rules, [(d, schedule[d]) for d in dates])
+
+    def recommend_swaps(self, rules, schedule=None, candidates=None, k=10, start=None,
+                        end=None, pool_size=300):
+        """ Finds the free agents improving the lineups of a date range the most.
+
+        Every (drop, add) swap is scored by the total lineup value gained over
+        the dates, with the weights of start_active (see lineup.recommend_swaps).
+        - rules: list of rules or compiled rules (see start_active)
+        - schedule: Schedule or dict date -> NHL teams playing on that date,
+                    the connection's schedule by default
+        - start, end: optional bounds of the dates (included)
+        - candidates: players that can be added (Player or PlayerRecord), by
+                      default the pool_size best available players of the league
+        returns: [list] of Swap(gain, drop, add), best first
+        """
+        from . import lineup
+        if not self._ranked:
+            self._get_ranks()
+        if candidates is None:
+            candidates = self.league.iter_players(status='A', sort='AR', ranks=True,
+                                                  limit=pool_size)
+        schedule = self._schedule(schedule)
+        roster = set(p.player_key for p in self.players)
+        candidates = [c for c in candidates if c.player_key not in roster]
+        for i, c in enumerate(candidates):
+            if c.rank is None and isinstance(c, PlayerRecord):
+                candidates[i] = c._replace(rank=xml_stream.UNRANKED)
+            elif c.rank is None:
+                c.rank = c.get_rank()
+        dates = self._dates(schedule, start, end)
+        slots = lineup.roster_slots(self.league.roster_positions)
+        return lineup.recommend_swaps(self.players, candidates, slots, rules,
+                                      [(d, schedule[d]) for d in dates], k)
 
-        # Creating the list of position. Final form should be
-        # [('C', 1), ('C', 2), ('LW', 1), etc.]
-        # This is required because the matching algorithm needs unique nodes
-        pos_list = []
-        c = Counter()
-        for p in self.league.roster_positions:
-            c[p] += 1
-            pos_list.append((p, c[p]))
-        pos_list.append(('BN', 99))
-        pos_list.append(('BN', 98))
-        pos_list.append(('BN', 97))
-        pos_list.append(('BN', 96))
-
-        # Creating the graph
-        G = nx.Graph()
+    def get_scoreboard(self):
+        """ Get the matchups of the current week, the team's matchup first
+        (see League.get_scoreboard). """
+        return self.league.get_scoreboard(team=self)
 
-        for player in self.players:
-            for pos_u in pos_list:
-                for pos in player.eligible_positions + ['BN']:
-                    if pos_u[0] == pos:
-                        # Initial weight rule
-                        weight = 1000 - player.rank
-                        # Apply the rules to modify the weight
-                        weight = rule_parser(weight, player, pos, playing_teams, rules)
-                        # Add the edge with the weight
-                        G.add_edge(pos_u, player.name['full'], weight=weight)
-
-                # If player is on IR or IR+ spot, keep it there
-                # Works even if the player is not injured anymore
-                if ((player.selected_position in ['IR', 'IR+']) and
-                        (player.selected_position == pos_u[0])):
-                    G.add_edge(pos_u, player.name['full'], weight=1001)
-
-        best = nx.max_weight_matching(G)
-
-        return best
+    def set_lineups(self, plan):
+        """ Sends the lineups of plan_lineups, one roster PUT per date with only
+        the changes from the previous date.
+
+        returns: [list] responses of the dates with changes
+        """
+        current = dict((p.name['full'], p.selected_position) for p in self.players)
+        responses = []
+        for day, best in plan.items():
+            r = self.update_roster(best, day=day, current=current)
+            if r is not None:
+                responses.append(r)
+            for name in current:
+                if name in best:
+                    current[name] = best[name][0]
+        return responses
 
     def __repr__(self):
         return u'<Team: {} - {}>'.format(self.name, self.league.name)
 
 
-class Player:
-    """ Player data with multiple attributes from data.
+class Player(object):
+    """ Player data with multiple attributes from a PlayerRecord (or the player
+    dict parsed by xmltodict).
     Can also get the fantasy rank of the player if rank=True
+    The data given is only kept in the data attribute if keep_raw=True.
     """
+    __slots__ = ('parent', 'data', 'player_key', 'name', 'selected_position', 'position',
+                 'eligible_positions', 'nhl_team', 'status', 'rank')
 
-    def __init__(self, player_data, parent, rank=False):
+    def __init__(self, player_data, parent, rank=False, keep_raw=False):
+        self.data = player_data if keep_raw else None
+        if not isinstance(player_data, PlayerRecord):
+            player_data = player_from_dict(player_data)
         self.parent = parent
-        self.data = player_data
-        self.player_key = player_data['player_key']
-        self.name = player_data['name']
-        self.selected_position = player_data['selected_position']['position']
-        self.position = player_data['display_position']
-        eligible_positions = player_data['eligible_positions']['position']
-        if isinstance(eligible_positions, basestring):
-            self.eligible_positions = [eligible_positions]
-        else:
-            self.eligible_positions = eligible_positions
-
-        self.nhl_team = player_data['editorial_team_abbr']
-        self.status = player_data.get('status', 'OK')
-        if rank:
+        self.player_key = player_data.player_key
+        self.name = player_data.name
+        # selected_position is only given when the player comes from a roster
+        self.selected_position = player_data.selected_position
+        self.position = player_data.position
+        self.eligible_positions = player_data.eligible_positions
+        self.nhl_team = player_data.nhl_team
+        self.status = player_data.status
+        self.rank = None
+        if player_data.rank is not None:
+            self.rank = player_data.rank
+        elif rank:
             self.rank = self.get_rank()
 
     def get_rank(self):
         url = 'player/{}/draft_analysis'.format(self.player_key)
         data = self.parent.get(url)
-        try:
-            return int(float(data['player']['draft_analysis']
-                             ['average_pick']))
-        except ValueError:
-            return 700
+        return _parse_rank(data['player']['draft_analysis'])
 
     def __repr__(self):
-        return '<Player: {:<4} - {} ({})>'.format(self.selected_position,
+        return '<Player: {:<4} - {} ({})>'.format(self.selected_position or '-',
                                                   self.name['full'],
                                                   self.position)
@@ -1,3 +1,23 @@
+try:
+    basestring
+except NameError:
+    basestring = str
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Player attributes usable in a 'player' condition and whether they are lists
+PLAYER_ATTRS = {
+    'eligible_positions': True,
+    'selected_position': False,
+    'position': False,
+    'nhl_team': False,
+    'status': False,
+    'player_key': False,
+}
+
 
 def _check_conditions(player, pos, playing_teams, conds):
     out = True
@@ -44,3 +64,104 @@ def rule_parser(weight, player, pos, playing_teams, rules):
             else:
                 weight = rule['weight']['value']
     return weight
+
+
+def _compile_condition(cond):
+    """ Validates a condition and returns (type, argument, inverse). """
+    inv = cond.get('inverse', False)
+    if not isinstance(inv, bool):
+        raise ValueError('inverse should be a boolean: {}'.format(inv))
+    if cond.get('type') == 'position':
+        position = cond.get('position')
+        if isinstance(position, basestring):
+            position = [position]
+        if not isinstance(position, list):
+            raise ValueError('position is not the correct type: '
+                             '{}'.format(type(position)))
+        return 'position', frozenset(position), inv
+    elif cond.get('type') == 'player':
+        if cond.get('attr') not in PLAYER_ATTRS:
+            raise ValueError('player attribute is not valid: {}'.format(cond.get('attr')))
+        if not isinstance(cond.get('value'), basestring):
+            raise ValueError('player value is not the correct type: '
+                             '{}'.format(type(cond.get('value'))))
+        return 'player', (cond['attr'], cond['value']), inv
+    elif cond.get('type') == 'not_playing':
+        return 'not_playing', None, inv
+    raise ValueError('condition type is not valid: {}'.format(cond.get('type')))
+
+
+class CompiledRules:
+    """ Rules validated once and applied to a whole players x positions weight
+    matrix at a time. Each rule is turned into a player mask and a position mask
+    whose outer product selects the cells it modifies.
+    - rules: list of rules (see rule.json) or CompiledRules
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        for rule in rules:
+            weight = rule.get('weight', dict())
+            kind = weight.get('type', 'absolute')
+            if kind not in ('absolute', 'relative'):
+                raise ValueError('weight type is not valid: {}'.format(kind))
+            if isinstance(weight.get('value'), bool) or \
+                    not isinstance(weight.get('value'), (int, float)):
+                raise ValueError('weight value is not a number: '
+                                 '{}'.format(weight.get('value')))
+            conds = [_compile_condition(c) for c in rule.get('conditions', [])]
+            self.rules.append((conds, kind == 'relative', weight['value']))
+
+    def masks(self, players, positions, playing_teams):
+        """ Returns a (player mask, position mask) pair of bool lists per rule. """
+        playing_teams = frozenset(playing_teams)
+        out = []
+        for conds, relative, value in self.rules:
+            rows = [True] * len(players)
+            cols = [True] * len(positions)
+            for kind, arg, inv in conds:
+                if kind == 'position':
+                    cols = [c and ((pos in arg) != inv) for c, pos in zip(cols, positions)]
+                elif kind == 'player':
+                    attr, val = arg
+                    if PLAYER_ATTRS[attr]:
+                        b = [val in getattr(p, attr) for p in players]
+                    else:
+                        b = [val == getattr(p, attr) for p in players]
+                    rows = [r and (x != inv) for r, x in zip(rows, b)]
+                else:
+                    rows = [r and ((p.nhl_team not in playing_teams) != inv)
+                            for r, p in zip(rows, players)]
+            out.append((rows, cols))
+        return out
+
+    def apply(self, weights, players, positions, playing_teams):
+        """ Applies the rules, in order, to a players x positions matrix.
+        Returns: numpy array if numpy is available, else list of lists
+        """
+        masks = self.masks(players, positions, playing_teams)
+        if np is not None:
+            weights = np.array(weights, dtype=float)
+            for (rows, cols), (_, relative, value) in zip(masks, self.rules):
+                mask = np.outer(rows, cols)
+                if relative:
+                    weights += value * mask
+                else:
+                    weights[mask] = value
+            return weights
+
+        weights = [list(row) for row in weights]
+        for (rows, cols), (_, relative, value) in zip(masks, self.rules):
+            for row, r in zip(weights, rows):
+                if r:
+                    for j, c in enumerate(cols):
+                        if c:
+                            row[j] = row[j] + value if relative else value
+        return weights
+
+
+def compile_rules(rules):
+    """ Validates a list of rules once (raises ValueError) for repeated use. """
+    if isinstance(rules, CompiledRules):
+        return rules
+    return CompiledRules(rules)
@@ -0,0 +1,228 @@
+"""
+NHL season schedule indexed by date and team.
+
+The schedule is loaded once, from a local file (json or csv) or from the NHL
+web API (Schedule.fetch, saved to a file for the next runs), and answers in
+constant time:
+- playing(date): set of the teams playing on a date
+- games(team, date): number of games of a team on a date
+- games_between(team, start, end) and games_remaining(team, date), the
+  number of games left in the fantasy week (Monday to Sunday)
+- starts(date) and first_start(date): start times of the games of a date,
+  when known
+
+Teams are identified by their Yahoo abbreviation (editorial_team_abbr, e.g.
+'Mtl', 'LA'); NHL abbreviations ('MTL', 'LAK') are translated with ALIASES.
+
+A Schedule can be given where a dict date -> playing teams is expected
+(Team.plan_lineups, Team.recommend_swaps), and to the connection so that
+Team.start_active only needs a date.
+"""
+from __future__ import absolute_import
+
+import io
+import csv
+import os
+import time
+import bisect
+import calendar
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+
+from .utils import json_get_data, json_write_data
+
+# schedule of the week starting at a date ('YYYY-MM-DD')
+NHL_SCHEDULE_URL = 'https://api-web.nhle.com/v1/schedule/{}'
+
+# NHL abbreviation -> Yahoo abbreviation
+ALIASES = {
+    'ANA': 'Anh', 'ARI': 'Ari', 'BOS': 'Bos', 'BUF': 'Buf', 'CGY': 'Cgy', 'CAR': 'Car',
+    'CHI': 'Chi', 'COL': 'Col', 'CBJ': 'Cls', 'DAL': 'Dal', 'DET': 'Det', 'EDM': 'Edm',
+    'FLA': 'Fla', 'LAK': 'LA', 'MIN': 'Min', 'MTL': 'Mtl', 'NSH': 'Nsh', 'NJD': 'NJ',
+    'NYI': 'NYI', 'NYR': 'NYR', 'OTT': 'Ott', 'PHI': 'Phi', 'PIT': 'Pit', 'SJS': 'SJ',
+    'STL': 'StL', 'TBL': 'TB', 'TOR': 'Tor', 'VAN': 'Van', 'VGK': 'VGK', 'WSH': 'Was',
+    'WPG': 'Wpg', 'SEA': 'Sea', 'UTA': 'Uta',
+}
+
+
+def as_date(day):
+    """ Converts a date, datetime or 'YYYY-MM-DD' string to a date. """
+    if isinstance(day, datetime):
+        return day.date()
+    if isinstance(day, date):
+        return day
+    return datetime.strptime(day, '%Y-%m-%d').date()
+
+
+def as_timestamp(start):
+    """ Converts a start time to seconds since the epoch: a timestamp, a
+    datetime (naive ones are in UTC) or a UTC ISO 8601 string such as
+    '2017-10-04T23:00:00Z'. """
+    if isinstance(start, (int, float)):
+        return float(start)
+    if not isinstance(start, datetime):
+        start = datetime.strptime(start.rstrip('Z')[:19], '%Y-%m-%dT%H:%M:%S')
+    if start.tzinfo is not None:
+        start = start.replace(tzinfo=None) - start.utcoffset()
+    return float(calendar.timegm(start.timetuple()))
+
+
+class Schedule:
+    """ Games of a season.
+    - games: iterable of (date, home team, away team), optionally followed by
+             the start time of the game (see as_timestamp)
+    - aliases: extra abbreviation -> Yahoo abbreviation translations
+    """
+
+    def __init__(self, games=(), aliases=None):
+        self.aliases = dict((k.upper(), v) for k, v in ALIASES.items())
+        self.aliases.update((v.upper(), v) for v in ALIASES.values())
+        if aliases:
+            self.aliases.update((k.upper(), v) for k, v in aliases.items())
+        self.games_list = []
+        playing = defaultdict(set)
+        counts = Counter()
+        self._starts = defaultdict(list)
+        for game in games:
+            day, home, away = as_date(game[0]), self.team(game[1]), self.team(game[2])
+            start = game[3] if len(game) > 3 else None
+            if start is not None:
+                start = as_timestamp(start)
+                self._starts[day].append(start)
+            self.games_list.append((day, home, away, start))
+            playing[day].update((home, away))
+            counts[home, day] += 1
+            counts[away, day] += 1
+        self._playing = dict((d, frozenset(t)) for d, t in playing.items())
+        self._counts = counts
+        for starts in self._starts.values():
+            starts.sort()
+        self.dates = sorted(self._playing)
+        # games played by each team before every date of the season
+        self._before = dict()
+        if self.dates:
+            self.first = self.dates[0]
+            length = (self.dates[-1] - self.first).days + 2
+            for team in set(t for t, _ in counts):
+                before = [0] * length
+                for i in range(1, length):
+                    before[i] = before[i - 1] + counts.get(
+                        (team, self.first + timedelta(i - 1)), 0)
+                self._before[team] = before
+
+    def team(self, abbr):
+        """ Returns the Yahoo abbreviation of a team. """
+        return self.aliases.get(abbr.upper(), abbr)
+
+    @classmethod
+    def from_file(cls, path, aliases=None):
+        """ Loads a json list of {date, home, away} or a csv with the columns
+        date, home and away, both with an optional start (UTC ISO 8601). """
+        if os.path.splitext(path)[1] == '.csv':
+            with io.open(path, newline='') as fp:
+                games = [(r['date'], r['home'], r['away'], r.get('start') or None)
+                         for r in csv.DictReader(fp)]
+        else:
+            games = [(g['date'], g['home'], g['away'], g.get('start'))
+                     for g in json_get_data(path)]
+        return cls(games, aliases)
+
+    def save(self, path):
+        out = []
+        for d, h, a, start in self.games_list:
+            game = {'date': d.strftime('%Y-%m-%d'), 'home': h, 'away': a}
+            if start is not None:
+                game['start'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(start))
+            out.append(game)
+        json_write_data(out, path)
+
+    @classmethod
+    def fetch(cls, season, path=None, url=NHL_SCHEDULE_URL, aliases=None):
+        """ Retrieves the regular season schedule from the NHL web API, one call
+        per week of games (about 30 calls).
+        - season: e.g. '20242025'
+        - path: file the schedule is saved to, and loaded from if it exists
+        """
+        if path is not None and os.path.exists(path):
+            return cls.from_file(path, aliases)
+        import requests
+        season = int(season)
+        day = '{}-09-01'.format(str(season)[:4])
+        games = []
+        while day is not None:
+            r = requests.get(url.format(day))
+            r.raise_for_status()
+            data = r.json()
+            week = [(d['date'], g) for d in data.get('gameWeek', ())
+                    for g in d.get('games', ()) if g.get('season') == season]
+            regular = [(d, g) for d, g in week if g.get('gameType') == 2]
+            games += [(d, g['homeTeam']['abbrev'], g['awayTeam']['abbrev'],
+                       g.get('startTimeUTC')) for d, g in regular]
+            # the playoffs started. Weeks of other games only (all-star game,
+            # international tournaments) can happen during the season
+            if any(g.get('gameType') == 3 for _, g in week):
+                break
+            next_day = data.get('nextStartDate')
+            day = next_day if next_day is not None and next_day > day else None
+        schedule = cls(games, aliases)
+        if path is not None:
+            schedule.save(path)
+        return schedule
+
+    def playing(self, day):
+        """ Returns the frozenset of the teams playing on a date. """
+        return self._playing.get(as_date(day), frozenset())
+
+    def starts(self, day):
+        """ Returns the sorted start times (seconds since the epoch) of the games
+        of a date whose start time is known. """
+        return list(self._starts.get(as_date(day), ()))
+
+    def first_start(self, day):
+        """ Start time of the first game of a date, None if unknown. """
+        starts = self._starts.get(as_date(day))
+        return starts[0] if starts else None
+
+    def next_date(self, day):
+        """ First date with games from a date (included), None after the season. """
+        i = bisect.bisect_left(self.dates, as_date(day))
+        return self.dates[i] if i < len(self.dates) else None
+
+    def games(self, team, day):
+        return self._counts.get((self.team(team), as_date(day)), 0)
+
+    def games_between(self, team, start, end):
+        """ Number of games of a team between two dates (included). """
+        before = self._before.get(self.team(team))
+        if before is None:
+            return 0
+        last = len(before) - 1
+
+        def index(day):
+            return min(max((as_date(day) - self.first).days, 0), last)
+
+        return max(before[index(as_date(end) + timedelta(1))] - before[index(start)], 0)
+
+    def games_remaining(self, team, day):
+        """ Number of games of a team from a date to the end of its fantasy
+        week (Sunday), the date included. """
+        day = as_date(day)
+        return self.games_between(team, day, day + timedelta(6 - day.weekday()))
+
+    def __getitem__(self, day):
+        return self.playing(day)
+
+    def __contains__(self, day):
+        return as_date(day) in self._playing
+
+    def __iter__(self):
+        return iter(self.dates)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __repr__(self):
+        if not self.dates:
+            return '<Schedule: empty>'
+        return '<Schedule: {} games from {} to {}>'.format(
+            len(self.games_list), self.dates[0], self.dates[-1])
@@ -0,0 +1,141 @@
+"""
+Client-side rate limiting and retry policy shared by all the callers of a
+Connection.
+
+The TokenBucket spaces out the requests. When Yahoo throttles us anyway
+(999/429) the bucket rate is halved and slowly restored on every success, so
+the throughput converges to the quota ceiling. Throttled and 5xx responses are
+retried with jittered exponential backoff, honoring Retry-After when given.
+"""
+from __future__ import absolute_import
+
+import time
+import random
+import threading
+from email.utils import parsedate_tz, mktime_tz
+
+# Status codes used by Yahoo to throttle requests
+THROTTLED = (429, 999)
+
+
+class TokenBucket:
+    """ Thread-safe token bucket.
+    - rate: tokens added per second
+    - capacity: maximum number of tokens (burst size), defaults to rate
+    - min_rate: floor of the rate when it is decreased after throttling
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = self.max_rate / 16 if min_rate is None else min_rate
+        self.capacity = float(capacity or max(rate, 1))
+        self._tokens = self.capacity
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """ Takes a token, possibly in advance.
+        Returns: [float] seconds to wait before using it
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.
+            return -self._tokens / self.rate
+
+    def decrease(self):
+        """ Halves the rate after a throttled response. """
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def increase(self):
+        """ Slowly restores the rate after a successful response. """
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+
+def retry_after(headers):
+    """ Returns the delay requested by the Retry-After header, None if absent. """
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(0., mktime_tz(parsed) - time.time())
+
+
+class Throttle:
+    """ Rate limiter and retry policy of a Connection.
+    - rate: maximum requests per second (None to disable the rate limiter)
+    - burst: number of requests allowed at once, defaults to rate
+    - max_retries: retries of a throttled or failed (5xx) request
+    - backoff: base delay in seconds of the exponential backoff
+    - max_backoff: maximum delay between two retries
+
+    Attributes wait_time (seconds spent waiting), retries and throttled count
+    what happened for all the callers.
+    """
+
+    def __init__(self, rate=None, burst=None, max_retries=5, backoff=0.5, max_backoff=60):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.wait_time = 0.
+        self.retries = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _count(self, wait=0., retry=0, throttled=0):
+        with self._lock:
+            self.wait_time += wait
+            self.retries += retry
+            self.throttled += throttled
+
+    def reserve(self):
+        """ Returns the delay to wait before sending the next request. """
+        if self.bucket is None:
+            return 0.
+        delay = self.bucket.reserve()
+        self._count(wait=delay)
+        return delay
+
+    def acquire(self):
+        """ Blocks until the next request can be sent. """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def retry_delay(self, status, headers, attempt):
+        """ Decides whether a response should be retried.
+        Returns: [float] delay before the retry, None if it should not be retried
+        """
+        throttled = status in THROTTLED
+        if not throttled and status < 500:
+            if self.bucket is not None:
+                self.bucket.increase()
+            return None
+        if throttled and self.bucket is not None:
+            self.bucket.decrease()
+        if attempt >= self.max_retries:
+            return None
+        delay = retry_after(headers)
+        if delay is None:
+            # full jitter
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        self._count(wait=delay, retry=1, throttled=int(throttled))
+        return delay
+
+    def stats(self):
+        return {'wait_time': self.wait_time, 'retries': self.retries,
+                'throttled': self.throttled,
+                'rate': self.bucket.rate if self.bucket is not None else None}
@@ -0,0 +1,125 @@
+"""
+Offline transports for Connection, used to work and measure without Yahoo:
+- RecordingTransport saves every successful response to a directory
+- ReplayTransport serves the responses saved in a directory, without login
+
+Example:
+    # once, with network access
+    conn = Connection('cred.json', transport=RecordingTransport('fixtures'))
+    conn.get_team(team_key, get_rank=True)
+    # then anywhere
+    conn = Connection(None, transport=ReplayTransport('fixtures'))
+    conn.get_team(team_key, get_rank=True)
+
+One file is saved per url, named after it (see fixture_name).
+"""
+from __future__ import absolute_import
+
+import os
+import re
+import time
+import hashlib
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from .utils import _write_replace
+
+BASE_URL = 'https://fantasysports.yahooapis.com/fantasy/v2/'
+
+
+def fixture_name(url):
+    """ Returns the file name of the response of url: readable part of the url
+    followed by a hash, as urls with many keys are too long for a file name.
+    """
+    if url.startswith(BASE_URL):
+        url = url[len(BASE_URL):]
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+    return '{}-{}.xml'.format(re.sub(r'[^\w.,;=-]+', '_', url)[:80], digest)
+
+
+def make_response(url, content, status_code=200, reason='OK'):
+    """ Builds a requests Response from a saved body. """
+    r = Response()
+    r.url = url
+    r.status_code = status_code
+    r.reason = reason
+    r.encoding = 'utf-8'
+    r.headers = CaseInsensitiveDict({'Content-Type': 'application/xml; charset=utf-8'})
+    r._content = content
+    return r
+
+
+class ReplayTransport:
+    """ Serves the responses saved in directory in place of the Yahoo API.
+    - directory: directory of the fixtures (see RecordingTransport)
+    - latency: seconds added to every request, to simulate the network
+
+    Urls without fixture get a 404 response. PUT requests are not sent
+    anywhere: they are kept in the puts attribute as (url, data) and succeed.
+    """
+    offline = True
+
+    def __init__(self, directory, latency=0.):
+        self.directory = directory
+        self.latency = latency
+        self.puts = []
+
+    def attach(self, connection):
+        """ Called by the Connection using the transport. """
+
+    def path(self, url):
+        return os.path.join(self.directory, fixture_name(url))
+
+    def get(self, url, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            with open(self.path(url), 'rb') as fp:
+                return make_response(url, fp.read())
+        except IOError:
+            return make_response(url, b'', 404, 'No recorded response')
+
+    def put(self, url, data=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        self.puts.append((url, data))
+        return make_response(url, b'')
+
+    def close(self):
+        pass
+
+
+class RecordingTransport(ReplayTransport):
+    """ Sends the requests and saves the successful GET responses to directory.
+    - directory: created if needed
+    - session: session used to send the requests, the logged in session of
+               the connection by default. Any object with the get and put
+               methods of a requests session works, the connection then
+               does not log in.
+    """
+
+    def __init__(self, directory, session=None):
+        ReplayTransport.__init__(self, directory)
+        self.session = session
+        self.offline = session is not None
+        self.connection = None
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def attach(self, connection):
+        self.connection = connection
+
+    def _session(self):
+        if self.session is not None:
+            return self.session
+        return self.connection.oauth.session
+
+    def get(self, url, **kwargs):
+        r = self._session().get(url, **kwargs)
+        if 200 <= r.status_code < 300:
+            _write_replace(self.path(url), lambda fp: fp.write(r.content), 'wb')
+        return r
+
+    def put(self, url, data=None, **kwargs):
+        return self._session().put(url, data, **kwargs)
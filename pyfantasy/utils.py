@@ -3,19 +3,18 @@ from __future__ import absolute_import, unicode_literals
 
 import os
 import json
-import yaml
-
-from rauth import OAuth1Service, OAuth2Service
+import tempfile
 
+# rauth is only imported when logging in (see get_service), yaml for .yml files
 services = {
     'oauth1': dict(
-        SERVICE=OAuth1Service,
+        SERVICE='OAuth1Service',
         REQUEST_TOKEN_URL="https://api.login.yahoo.com/oauth/v2/get_request_token",
         ACCESS_TOKEN_URL="https://api.login.yahoo.com/oauth/v2/get_token",
         AUTHORIZE_TOKEN_URL="https://api.login.yahoo.com/oauth/v2/request_auth"
     ),
     'oauth2': dict(
-        SERVICE=OAuth2Service,
+        SERVICE='OAuth2Service',
         AUTHORIZE_TOKEN_URL="https://api.login.yahoo.com/oauth2/request_auth",
         ACCESS_TOKEN_URL="https://api.login.yahoo.com/oauth2/get_token"
     )
@@ -24,6 +23,16 @@ services = {
 CALLBACK_URI = 'oob'
 
 
+def get_service(oauth_version, **params):
+    """Builds the service of oauth_version, a rauth class name or a class
+    """
+    service = services[oauth_version]['SERVICE']
+    if not callable(service):
+        import rauth
+        service = getattr(rauth, service)
+    return service(**params)
+
+
 def get_file_extension(filename):
     return os.path.splitext(filename)
 
@@ -44,13 +53,39 @@ def write_data(data, filename):
     return func(data, filename)
 
 
+def _replace(src, dst):
+    """Moves src over dst in one step (os.rename can't overwrite on python 2 + windows)
+    """
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def _write_replace(filename, write, mode='w'):
+    """Calls write(fp) on a new temporary file of the directory of filename, then
+    moves it over filename. The name of the temporary file is unique, so that
+    concurrent writers (threads or processes) don't collide
+    """
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(filename) or '.')
+    try:
+        with os.fdopen(fd, mode) as fp:
+            write(fp)
+        _replace(tmp, filename)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+
 def json_write_data(json_data, filename):
-    """Write json data into a file
+    """Write json data into a file. The data is written to a temporary file
+    first, so readers never see a half written file.
     """
-    with open(filename, 'w') as fp:
-        json.dump(json_data, fp, indent=4, sort_keys=True, ensure_ascii=False)
-        return True
-    return False
+    _write_replace(filename, lambda fp: json.dump(json_data, fp, indent=4, sort_keys=True,
+                                                  ensure_ascii=False))
+    return True
 
 
 def json_get_data(filename):
@@ -66,6 +101,7 @@ def json_get_data(filename):
 def yaml_get_data(filename):
     """Get data from .yml file
     """
+    import yaml
     with open(filename, 'rb') as fd:
         yaml_data = yaml.load(fd)
         return yaml_data
@@ -73,10 +109,8 @@ def yaml_get_data(filename):
 
 
 def yaml_write_data(yaml_data, filename):
-    """Write data into a .yml file
+    """Write data into a .yml file, through a temporary file as json_write_data
     """
-    with open(filename, 'w') as fd:
-        yaml.dump(yaml_data, fd, default_flow_style=False)
-        return True
-
-    return False
+    import yaml
+    _write_replace(filename, lambda fd: yaml.dump(yaml_data, fd, default_flow_style=False))
+    return True
@@ -0,0 +1,185 @@
+"""
+Local store of player and team stats, synced incrementally from Yahoo.
+
+Every (key, period) pair retrieved for a complete period (a past date, a
+past week) is recorded, so a sync only asks Yahoo for the missing ones and
+for the open period, whose stats still change: backfilling a season is done
+once, and each new day then costs one call per MAX_KEYS players. Queries are
+served from the sqlite file.
+
+Example:
+    wh = StatsWarehouse(conn, 'stats.sqlite')
+    wh.sync_players(player_keys, dates)
+    arrays = wh.load_arrays('player', player_keys, dates, ['1', '2'])
+"""
+from __future__ import absolute_import
+
+import sqlite3
+import threading
+from datetime import date
+
+from . import xml_stream
+from .pyfantasy import MAX_KEYS, _chunks
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _period(period):
+    """ Periods are stored as text: 'YYYY-MM-DD' for dates, the zero-padded number
+    for weeks ('02'), so that both sort as text in order. """
+    if isinstance(period, date):
+        return period.strftime('%Y-%m-%d')
+    period = str(period)
+    return '{:02d}'.format(int(period)) if period.isdigit() else period
+
+
+def _value(value):
+    """ Stats are stored as float when possible, as text otherwise (e.g. 5/20). """
+    if value is None or value in ('-', ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class StatsWarehouse:
+    """ sqlite store of stats.
+    - connection: Connection used to retrieve the missing stats
+    - path: sqlite file (':memory:' for a store living in the process)
+
+    Stats are identified by kind ('player' or 'team'), key (player or team key),
+    period (date or week) and stat_id.
+    """
+
+    def __init__(self, connection, path=':memory:'):
+        self.connection = connection
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS stats (kind TEXT, key TEXT, '
+                             'period TEXT, stat_id TEXT, value, '
+                             'PRIMARY KEY (kind, key, period, stat_id))')
+            self._db.execute('CREATE TABLE IF NOT EXISTS synced (kind TEXT, key TEXT, '
+                             'period TEXT, PRIMARY KEY (kind, key, period))')
+            # weeks were stored without padding by the previous versions
+            for table in ('stats', 'synced'):
+                self._db.execute("UPDATE OR REPLACE {} SET period = '0' || period "
+                                 "WHERE length(period) = 1".format(table))
+
+    def missing(self, kind, keys, periods):
+        """ Returns: [dict] period -> keys not synced yet for that period """
+        out = dict()
+        with self._lock:
+            for period in periods:
+                period = _period(period)
+                synced = set(row[0] for row in self._db.execute(
+                    'SELECT key FROM synced WHERE kind = ? AND period = ?', (kind, period)))
+                keys_missing = [k for k in keys if k not in synced]
+                if keys_missing:
+                    out[period] = keys_missing
+        return out
+
+    def _store(self, kind, period, keys, stats, complete=True):
+        """ Stores stats [(key, [(stat_id, value)])] and marks keys as synced if
+        the period is complete. """
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?, ?)',
+                [(kind, key, period, stat_id, _value(value))
+                 for key, values in stats for stat_id, value in values])
+            if complete:
+                self._db.executemany('INSERT OR REPLACE INTO synced VALUES (?, ?, ?)',
+                                     [(kind, key, period) for key in keys])
+
+    def _sync(self, kind, keys, periods, url, extractor, complete, convert=list):
+        """ complete(period): whether the stats of period are final """
+        jobs = [(period, chunk) for period, missing in
+                sorted(self.missing(kind, keys, periods).items())
+                for chunk in _chunks(missing, MAX_KEYS)]
+
+        def fetch(job):
+            period, chunk = job
+            records = self.connection.stream(url(period, chunk), extractor)
+            self._store(kind, period, chunk, convert(records), complete(period))
+
+        self.connection.map(fetch, jobs)
+        return len(jobs)
+
+    def sync_players(self, player_keys, dates):
+        """ Retrieves the daily stats of the players for the dates not synced yet.
+        The stats of today (and later) are fetched again on every sync.
+        Returns: [int] number of calls made
+        """
+        today = _period(date.today())
+
+        def url(period, chunk):
+            return 'players;player_keys={}/stats;type=date;date={}'.format(
+                ','.join(chunk), period)
+        return self._sync('player', player_keys, dates, url, xml_stream.iter_player_stats,
+                          lambda period: period < today)
+
+    def sync_teams(self, team_keys, weeks, current_week=None):
+        """ Retrieves the weekly stats of the teams for the weeks not synced yet.
+        The stats of the current week (and later) are fetched again on every sync.
+        - current_week: current week of the leagues, retrieved from the league
+                        of the first team if not given
+        Returns: [int] number of calls made
+        """
+        if current_week is None and team_keys:
+            league_key = team_keys[0][:team_keys[0].rfind('.') - 2]
+            current_week = self.connection.get(
+                'league/{}'.format(league_key))['league']['current_week']
+        current_week = int(current_week or 0)
+
+        def url(period, chunk):
+            return 'teams;team_keys={}/stats;type=week;week={}'.format(
+                ','.join(chunk), int(period))
+
+        def convert(records):
+            return [(team.team_key, team.stats) for team in records]
+        return self._sync('team', team_keys, weeks, url, xml_stream.iter_team_stats,
+                          lambda period: int(period) < current_week, convert)
+
+    def query(self, kind, keys=None, start=None, end=None, stat_ids=None):
+        """ Returns the stored stats as (key, period, stat_id, value) rows.
+        - keys, stat_ids: restrict to these keys/stats
+        - start, end: range of periods (included), dates or week numbers
+        """
+        sql = 'SELECT key, period, stat_id, value FROM stats WHERE kind = ?'
+        args = [kind]
+        if keys is not None:
+            sql += ' AND key IN ({})'.format(','.join('?' * len(keys)))
+            args += list(keys)
+        if stat_ids is not None:
+            sql += ' AND stat_id IN ({})'.format(','.join('?' * len(stat_ids)))
+            args += list(stat_ids)
+        if start is not None:
+            sql += ' AND period >= ?'
+            args.append(_period(start))
+        if end is not None:
+            sql += ' AND period <= ?'
+            args.append(_period(end))
+        with self._lock:
+            return self._db.execute(sql + ' ORDER BY key, period, stat_id',
+                                    args).fetchall()
+
+    def load_arrays(self, kind, keys, periods, stat_ids):
+        """ Loads stats as one keys x periods array per stat (NaN if missing).
+        Returns: [dict] stat_id -> numpy array (lists of lists without numpy)
+        """
+        periods = [_period(p) for p in periods]
+        key_index = dict((k, i) for i, k in enumerate(keys))
+        period_index = dict((p, j) for j, p in enumerate(periods))
+        out = dict((s, [[float('nan')] * len(periods) for _ in keys]) for s in stat_ids)
+        for key, period, stat_id, value in self.query(kind, keys, stat_ids=stat_ids):
+            j = period_index.get(period)
+            if j is not None and isinstance(value, float):
+                out[stat_id][key_index[key]][j] = value
+        if np is not None:
+            out = dict((s, np.array(v)) for s, v in out.items())
+        return out
@@ -0,0 +1,163 @@
+"""
+Streaming extractors for the hot Yahoo resources.
+
+Instead of building the whole document with xmltodict, the responses are read
+with iterparse and every element of interest is turned into a record as soon
+as it is complete, then cleared. Each extractor takes the raw response
+(bytes, text or file object) and yields records:
+- iter_players: PlayerRecord for every player (rosters, player collections)
+- iter_rosters: RosterRecord for every team of a roster response
+- iter_ranks: (player_key, rank) from draft_analysis responses
+- iter_team_stats: TeamRecord for every team (standings)
+- iter_matchups: (week, [TeamRecord]) for every matchup (scoreboard)
+- iter_player_stats: (player_key, [(stat_id, value)]) from player stats
+"""
+from __future__ import absolute_import
+
+import io
+from collections import namedtuple
+from xml.etree.ElementTree import iterparse
+
+# Rank given to players that were never drafted
+UNRANKED = 700
+
+PlayerRecord = namedtuple('PlayerRecord', [
+    'player_key', 'name', 'selected_position', 'position', 'eligible_positions',
+    'nhl_team', 'status', 'rank'])
+RosterRecord = namedtuple('RosterRecord', ['team_key', 'name', 'players'])
+TeamRecord = namedtuple('TeamRecord', [
+    'team_key', 'name', 'rank', 'outcome', 'points_total', 'points_change', 'owner',
+    'stats'])
+
+
+def rank_from_pick(average_pick):
+    """ Converts a draft average pick to a rank. """
+    try:
+        return int(float(average_pick))
+    except ValueError:
+        return UNRANKED
+
+
+def _source(source):
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    if not hasattr(source, 'read'):
+        return io.BytesIO(source.encode('utf-8'))
+    return source
+
+
+def _iterparse(source, patterns):
+    """ Yields (pattern, element) for every complete element whose path ends
+    with one of the patterns (e.g. 'team/name'). Namespaces are removed and the
+    element is cleared once consumed.
+    """
+    patterns = [(p, p.split('/')) for p in patterns]
+    path = []
+    for event, elem in iterparse(_source(source), events=('start', 'end')):
+        if event == 'start':
+            path.append(elem.tag.rsplit('}', 1)[-1])
+            continue
+        elem.tag = path[-1]
+        for pattern, parts in patterns:
+            if path[-len(parts):] == parts:
+                yield pattern, elem
+                elem.clear()
+                break
+        path.pop()
+
+
+def _text(elem, path, default=None):
+    child = elem.find(path)
+    if child is None or child.text is None:
+        return default
+    return child.text
+
+
+def _player(elem):
+    draft = _text(elem, 'draft_analysis/average_pick')
+    return PlayerRecord(
+        player_key=_text(elem, 'player_key'),
+        name=dict((c.tag, c.text) for c in elem.findall('name/*')),
+        selected_position=_text(elem, 'selected_position/position'),
+        position=_text(elem, 'display_position'),
+        eligible_positions=[p.text for p in elem.findall('eligible_positions/position')],
+        nhl_team=_text(elem, 'editorial_team_abbr'),
+        status=_text(elem, 'status', 'OK'),
+        rank=None if draft is None else rank_from_pick(draft))
+
+
+def player_from_dict(data):
+    """ Builds a PlayerRecord from a player parsed by xmltodict. """
+    eligible = data['eligible_positions']['position']
+    draft = data.get('draft_analysis')
+    return PlayerRecord(
+        player_key=data['player_key'],
+        name=dict(data['name']),
+        selected_position=data.get('selected_position', dict()).get('position'),
+        position=data['display_position'],
+        eligible_positions=eligible if isinstance(eligible, list) else [eligible],
+        nhl_team=data['editorial_team_abbr'],
+        status=data.get('status', 'OK'),
+        rank=None if draft is None else rank_from_pick(draft['average_pick']))
+
+
+def _team(elem):
+    outcome = elem.find('team_standings/outcome_totals')
+    rank = _text(elem, 'team_standings/rank')
+    return TeamRecord(
+        team_key=_text(elem, 'team_key'),
+        name=_text(elem, 'name'),
+        rank=None if rank is None else int(rank),
+        outcome=None if outcome is None else tuple(
+            int(_text(outcome, k)) for k in ('wins', 'losses', 'ties')),
+        points_total=_text(elem, 'team_points/total'),
+        points_change=_text(elem, 'team_standings/points_change'),
+        owner=_text(elem, 'managers/manager/nickname'),
+        stats=[(_text(s, 'stat_id'), _text(s, 'value'))
+               for s in elem.findall('team_stats/stats/stat')])
+
+
+def iter_players(source):
+    for _, elem in _iterparse(source, ['player']):
+        yield _player(elem)
+
+
+def iter_rosters(source):
+    team_key = name = None
+    players = []
+    for pattern, elem in _iterparse(source, ['team/team_key', 'team/name', 'player',
+                                             'team']):
+        if pattern == 'team/team_key':
+            team_key = elem.text
+        elif pattern == 'team/name':
+            name = elem.text
+        elif pattern == 'player':
+            players.append(_player(elem))
+        else:
+            yield RosterRecord(team_key, name, players)
+            players = []
+
+
+def iter_ranks(source):
+    for _, elem in _iterparse(source, ['player']):
+        yield (_text(elem, 'player_key'),
+               rank_from_pick(_text(elem, 'draft_analysis/average_pick', '-')))
+
+
+def iter_team_stats(source):
+    for _, elem in _iterparse(source, ['team']):
+        yield _team(elem)
+
+
+def iter_matchups(source):
+    for _, elem in _iterparse(source, ['matchup']):
+        week = _text(elem, 'week')
+        yield (None if week is None else int(week),
+               [_team(t) for t in elem.findall('teams/team')])
+
+
+def iter_player_stats(source):
+    for _, elem in _iterparse(source, ['player']):
+        yield (_text(elem, 'player_key'),
+               [(_text(st, 'stat_id'), _text(st, 'value'))
+                for st in elem.findall('player_stats/stats/stat')])
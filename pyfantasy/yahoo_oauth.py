@@ -11,11 +11,12 @@ except NameError:
 
 import json
 import time
+import threading
 import webbrowser
 
 import base64
 
-from .utils import services, CALLBACK_URI
+from .utils import services, get_service, CALLBACK_URI
 from .utils import get_data, write_data
 
 
@@ -33,6 +34,7 @@ class OAuth2():
         base_url : Base url
         """
         self.oauth_version = 'oauth2'
+        self._lock = threading.Lock()
         data = {}
 
         if kwargs.get('from_file'):
@@ -42,6 +44,7 @@ class OAuth2():
         else:
             self.consumer_key = consumer_key
             self.consumer_secret = consumer_secret
+        stored = dict(data)
 
         vars(self).update(kwargs)
 
@@ -62,7 +65,7 @@ class OAuth2():
         })
 
         # Defining oauth service
-        self.oauth = services[self.oauth_version]['SERVICE'](**service_params)
+        self.oauth = get_service(self.oauth_version, **service_params)
 
         if (vars(self).get('access_token') and
                 vars(self).get('access_token_secret') and
@@ -80,7 +83,8 @@ class OAuth2():
         # Getting session
         self.session = self.oauth.get_session(token=self.access_token)
 
-        write_data(data, vars(self).get('from_file', 'secrets.json'))
+        if data != stored:
+            write_data(data, vars(self).get('from_file', 'secrets.json'))
 
     def handler(self,):
         """* get request token if OAuth1
@@ -96,9 +100,7 @@ class OAuth2():
         webbrowser.open(authorize_url)
         self.verifier = input("Enter verifier : ")
 
-        self.token_time = time.time()
-
-        credentials = {'token_time': self.token_time}
+        credentials = {'token_time': time.time()}
 
         # Building headers
         headers = self.generate_oauth2_headers()
@@ -108,6 +110,7 @@ class OAuth2():
                   'grant_type': 'authorization_code'},
             headers=headers)
         credentials.update(self.oauth2_access_parser(raw_access))
+        vars(self).update(credentials)
 
         return credentials
 
@@ -124,19 +127,15 @@ class OAuth2():
         return headers
 
     def oauth2_access_parser(self, raw_access):
-        """Parse oauth2 access
+        """Parse oauth2 access, without changing the current credentials
         """
         parsed_access = json.loads(raw_access.content.decode('utf-8'))
-        self.access_token = parsed_access['access_token']
-        self.token_type = parsed_access['token_type']
-        self.refresh_token = parsed_access['refresh_token']
-        self.guid = parsed_access['xoauth_yahoo_guid']
 
         credentials = {
-            'access_token': self.access_token,
-            'token_type': self.token_type,
-            'refresh_token': self.refresh_token,
-            'guid': self.guid
+            'access_token': parsed_access['access_token'],
+            'token_type': parsed_access['token_type'],
+            'refresh_token': parsed_access['refresh_token'],
+            'guid': parsed_access['xoauth_yahoo_guid']
         }
 
         return credentials
@@ -144,20 +143,25 @@ class OAuth2():
     def refresh_access_token(self,):
         """Refresh access token
         """
-        self.token_time = time.time()
+        credentials = self._new_access_token()
+        vars(self).update(credentials)
+        return credentials
+
+    def _new_access_token(self,):
+        """Gets a new access token, without changing the current credentials
+        """
         credentials = {
-            'token_time': self.token_time
+            'token_time': time.time()
         }
 
         if self.oauth_version == 'oauth1':
-            self.access_token, self.access_token_secret = self.oauth.get_access_token(
+            access_token, access_token_secret = self.oauth.get_access_token(
                 self.access_token, self.access_token_secret,
                 params={"oauth_session_handle": self.session_handle})
             credentials.update({
-                'access_token': self.access_token,
-                'access_token_secret': self.access_token_secret,
-                'session_handle': self.session_handle,
-                'token_time': self.token_time
+                'access_token': access_token,
+                'access_token_secret': access_token_secret,
+                'session_handle': self.session_handle
             })
         else:
             headers = self.generate_oauth2_headers()
@@ -173,6 +177,46 @@ class OAuth2():
 
         return credentials
 
+    def refresh(self, stale_token=None):
+        """Refreshes the token in place: the session keeps its connections and
+        only its token changes. Safe to call from many threads at once, only one
+        refresh is made.
+        stale_token : token rejected by the server. If another thread already
+                      replaced it, nothing is done. Without it, the token is
+                      only refreshed if it is about to expire.
+        Returns True if the token was refreshed by this call
+        """
+        with self._lock:
+            if stale_token is None:
+                if self.token_is_valid():
+                    return False
+            elif stale_token != self.access_token:
+                return False
+            credentials = self._new_access_token()
+            # the session first: a thread reading the new access_token must
+            # send it with the new session, else its 401 would refresh again
+            self.session.access_token = credentials['access_token']
+            vars(self).update(credentials)
+            self._save(credentials)
+            return True
+
+    def ensure_valid(self,):
+        """Refreshes the token if it is about to expire
+        """
+        if not self.token_is_valid():
+            self.refresh()
+
+    def _save(self, credentials):
+        """Updates the credentials file, only if the credentials changed
+        """
+        filename = vars(self).get('from_file')
+        if not filename:
+            return
+        data = get_data(filename) or {}
+        new_data = dict(data, **credentials)
+        if new_data != data:
+            write_data(new_data, filename)
+
     def token_is_valid(self,):
         """Check the validity of the token :3600s
         """
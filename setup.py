@@ -9,10 +9,18 @@ setup(
     author_email='marc.a.schmidt@gmail.com',
     license='MIT',
     packages=['pyfantasy'],
+    package_data={'pyfantasy': ['rule.json']},
+    entry_points={
+      'console_scripts': ['pyfantasy=pyfantasy.daemon:main'],
+    },
     zip_safe=False,
     install_requires=[
       'xmltodict',
       'rauth',
       'pyyaml',
     ],
+    extras_require={
+      'fast': ['numpy', 'scipy'],
+      'async': ['aiohttp'],
+    },
 )
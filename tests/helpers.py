@@ -0,0 +1,32 @@
+"""
+Base test case of the tests running on the synthetic league (see synthetic.py).
+"""
+import shutil
+import tempfile
+import unittest
+
+import synthetic
+
+
+class SyntheticTestCase(unittest.TestCase):
+    """ Creates a connection to the synthetic league in a temporary directory
+    for every test: session is the session_class instance answering it, conn
+    the Connection. connection_kwargs are passed to the Connection. """
+
+    session_class = synthetic.SyntheticYahoo
+    connection_kwargs = {}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.session = self.session_class()
+        self.conn = self.connect()
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.directory)
+
+    def connect(self, **kwargs):
+        """ Returns: a new Connection on session, kwargs override
+        connection_kwargs """
+        options = dict(self.connection_kwargs, **kwargs)
+        return synthetic.connection(self.directory, session=self.session, **options)
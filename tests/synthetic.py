@@ -0,0 +1,223 @@
+"""
+Synthetic Yahoo Fantasy API used by the tests and the benchmarks.
+
+SyntheticYahoo has the get and put methods of a session and answers the
+resources used by the tests and benchmarks with deterministic XML: one league of
+NUM_TEAMS teams whose rosters have the sizes of ROSTER_SIZES, a pool of
+POOL_SIZE available players, draft analysis, standings, scoreboards and
+NUM_TRANSACTIONS transactions.
+"""
+from __future__ import absolute_import
+
+import re
+import random
+
+from pyfantasy import Connection
+from pyfantasy.transport import BASE_URL, RecordingTransport, make_response
+
+LEAGUE_KEY = '363.l.1000'
+NUM_TEAMS = 12
+# roster size of the first teams, the others have 16 players
+ROSTER_SIZES = {1: 16, 2: 20, 3: 25, 4: 40}
+NUM_TRANSACTIONS = 500
+POOL_SIZE = 1000
+# timestamp of the newest transaction
+LAST_TIMESTAMP = 1500000000
+
+NS = 'http://fantasysports.yahooapis.com/fantasy/v2/base.rng'
+POSITIONS = ['C', 'C', 'LW', 'LW', 'RW', 'RW', 'D', 'D', 'D', 'D', 'Util', 'G', 'G',
+             'BN', 'BN', 'IR']
+ELIGIBLE = [['C'], ['LW', 'RW'], ['C', 'LW'], ['D'], ['G'], ['RW'], ['C', 'RW']]
+NHL_TEAMS = ['Bos', 'Mtl', 'Tor', 'NYR', 'Pit', 'Chi', 'Edm', 'Cgy', 'Van', 'LA']
+STATS = [('1', 'G'), ('2', 'A'), ('4', '+/-'), ('5', 'PIM'), ('14', 'SOG'), ('19', 'W'),
+         ('23', 'GAA'), ('26', 'SV%')]
+
+
+def team_key(n):
+    return '{}.t.{}'.format(LEAGUE_KEY, n)
+
+
+def _wrap(body):
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<fantasy_content xmlns="{}" '
+            'xml:lang="en-US">{}</fantasy_content>'.format(NS, body))
+
+
+def _player(pid, selected=None, draft=False):
+    rnd = random.Random(pid)
+    eligible = rnd.choice(ELIGIBLE)
+    out = ('<player><player_key>nhl.p.{0}</player_key><player_id>{0}</player_id>'
+           '<name><full>Player {0}</full><first>Player</first><last>{0}</last></name>'
+           '<editorial_team_abbr>{1}</editorial_team_abbr>'
+           '<display_position>{2}</display_position>').format(
+               pid, rnd.choice(NHL_TEAMS), ','.join(eligible))
+    if rnd.random() < 0.15:
+        out += '<status>{}</status>'.format(rnd.choice(['DTD', 'IR', 'O']))
+    out += '<eligible_positions>{}</eligible_positions>'.format(
+        ''.join('<position>{}</position>'.format(p) for p in eligible))
+    if selected is not None:
+        out += ('<selected_position><coverage_type>date</coverage_type>'
+                '<date>2017-01-01</date><position>{}</position>'
+                '</selected_position>').format(selected)
+    if draft:
+        out += _draft_analysis(pid)
+    return out + '</player>'
+
+
+def _draft_analysis(pid):
+    pick = '-' if pid % 11 == 0 else '{}.4'.format(pid % 300 + 1)
+    return '<draft_analysis><average_pick>{}</average_pick></draft_analysis>'.format(pick)
+
+
+def _pool(start, count, draft):
+    pids = range(20000 + start, 20000 + min(start + count, POOL_SIZE))
+    return ('<league><league_key>{}</league_key><players count="{}">{}</players>'
+            '</league>').format(LEAGUE_KEY, len(pids),
+                                ''.join(_player(pid, draft=draft) for pid in pids))
+
+
+def _roster(n):
+    size = ROSTER_SIZES.get(n, 16)
+    players = ''.join(_player(n * 100 + i, POSITIONS[i % len(POSITIONS)])
+                      for i in range(size))
+    return ('<team><team_key>{0}</team_key><name>Team {1}</name><roster>'
+            '<coverage_type>date</coverage_type><players count="{2}">{3}</players>'
+            '</roster></team>').format(team_key(n), n, size, players)
+
+
+def _settings():
+    roster_positions = ''.join(
+        '<roster_position><position>{}</position><count>{}</count>'
+        '</roster_position>'.format(p, POSITIONS.count(p))
+        for p in ['C', 'LW', 'RW', 'D', 'Util', 'G', 'BN', 'IR'])
+    stats = ''.join('<stat><stat_id>{0}</stat_id><enabled>1</enabled><name>{1}</name>'
+                    '<display_name>{1}</display_name></stat>'.format(i, name)
+                    for i, name in STATS)
+    return ('<league><league_key>{0}</league_key><name>Synthetic league</name>'
+            '<scoring_type>head</scoring_type><settings><roster_positions>{1}'
+            '</roster_positions><stat_categories><stats>{2}</stats></stat_categories>'
+            '</settings></league>').format(LEAGUE_KEY, roster_positions, stats)
+
+
+def _team_stats(n, week, standings=False):
+    rnd = random.Random(n * 1000 + week)
+    stats = ''.join('<stat><stat_id>{}</stat_id><value>{}</value></stat>'.format(
+        i, round(rnd.uniform(0, 30), 3)) for i, _ in STATS)
+    out = ('<team><team_key>{0}</team_key><name>Team {1}</name><managers><manager>'
+           '<nickname>Owner {1}</nickname></manager></managers><team_stats>'
+           '<coverage_type>week</coverage_type><stats>{2}</stats></team_stats>'
+           '<team_points><total>{3}</total></team_points>').format(
+               team_key(n), n, stats, rnd.randint(0, 8))
+    if standings:
+        out += ('<team_standings><rank>{}</rank><outcome_totals><wins>{}</wins>'
+                '<losses>{}</losses><ties>0</ties></outcome_totals><points_change>0'
+                '</points_change></team_standings>').format(n, 20 - n, n)
+    return out + '</team>'
+
+
+def _standings():
+    teams = ''.join(_team_stats(n, 0, standings=True) for n in range(1, NUM_TEAMS + 1))
+    return ('<league><league_key>{}</league_key><standings><teams count="{}">{}</teams>'
+            '</standings></league>').format(LEAGUE_KEY, NUM_TEAMS, teams)
+
+
+def _scoreboard(weeks):
+    matchups = ''
+    for week in weeks:
+        for a in range(1, NUM_TEAMS + 1, 2):
+            matchups += ('<matchup><week>{}</week><teams count="2">{}{}</teams>'
+                         '</matchup>').format(week, _team_stats(a, week),
+                                              _team_stats(a + 1, week))
+    return ('<league><league_key>{}</league_key><scoreboard><week>{}</week><matchups>'
+            '{}</matchups></scoreboard></league>').format(LEAGUE_KEY, weeks[0], matchups)
+
+
+def _transactions(start, count):
+    ids = range(NUM_TRANSACTIONS - start, max(NUM_TRANSACTIONS - start - count, 0), -1)
+    out = ''
+    for i in ids:
+        out += ('<transaction><transaction_key>{0}.tr.{1}</transaction_key>'
+                '<transaction_id>{1}</transaction_id><type>add/drop</type>'
+                '<status>successful</status><timestamp>{2}</timestamp>'
+                '<players count="2">').format(LEAGUE_KEY, i, LAST_TIMESTAMP - 600 * (
+                    NUM_TRANSACTIONS - i))
+        for pid, kind in ((i, 'add'), (i + 5000, 'drop')):
+            out += ('<player><player_key>nhl.p.{0}</player_key><name><full>Player {0}'
+                    '</full></name><transaction_data><type>{1}</type>'
+                    '<source_type>{2}</source_type><destination_type>{3}'
+                    '</destination_type><destination_team_name>Team 1'
+                    '</destination_team_name></transaction_data></player>').format(
+                        pid, kind, 'freeagents' if kind == 'add' else 'team',
+                        'team' if kind == 'add' else 'waivers')
+        out += '</players></transaction>'
+    return ('<league><league_key>{}</league_key><transactions count="{}">{}'
+            '</transactions></league>').format(LEAGUE_KEY, len(ids), out)
+
+
+class SyntheticYahoo:
+    """ Session answering the synthetic league resources. The urls of the
+    requests are kept in gets and puts. """
+
+    def __init__(self):
+        self.gets = []
+        self.puts = []
+
+    def get(self, url, **kwargs):
+        self.gets.append(url)
+        path = url[len(BASE_URL):] if url.startswith(BASE_URL) else url
+        body = self.route(path)
+        if body is None:
+            return make_response(url, b'', 404, 'Not Found')
+        return make_response(url, _wrap(body).encode('utf-8'))
+
+    def put(self, url, data=None, **kwargs):
+        self.puts.append(url)
+        return make_response(url, b'')
+
+    @staticmethod
+    def route(path):
+        m = re.match(r'team/[\w.]+\.t\.(\d+)/roster$', path)
+        if m:
+            return _roster(int(m.group(1)))
+        m = re.match(r'teams;team_keys=([^/]+)/roster$', path)
+        if m:
+            keys = m.group(1).split(',')
+            return '<teams count="{}">{}</teams>'.format(len(keys), ''.join(
+                _roster(int(k.rsplit('.', 1)[1])) for k in keys))
+        if path == 'league/{}/settings'.format(LEAGUE_KEY):
+            return _settings()
+        if path == 'leagues;league_keys={}/settings'.format(LEAGUE_KEY):
+            return '<leagues count="1">{}</leagues>'.format(_settings())
+        if path == 'league/{}/standings'.format(LEAGUE_KEY):
+            return _standings()
+        m = re.match(r'league/[\w.]+/scoreboard(;week=([\d,]+))?$', path)
+        if m:
+            return _scoreboard([int(w) for w in m.group(2).split(',')]
+                               if m.group(2) else [1])
+        m = re.match(r'league/[\w.]+/transactions;start=(\d+);count=(\d+)$', path)
+        if m:
+            return _transactions(int(m.group(1)), int(m.group(2)))
+        m = re.match(r'players;player_keys=([^/]+)/draft_analysis$', path)
+        if m:
+            keys = m.group(1).split(',')
+            return '<players count="{}">{}</players>'.format(len(keys), ''.join(
+                '<player><player_key>{}</player_key>{}</player>'.format(
+                    k, _draft_analysis(int(k.rsplit('.', 1)[1]))) for k in keys))
+        m = re.match(r'league/[\w.]+/players;[^/]*start=(\d+);count=(\d+)'
+                     r'(/draft_analysis)?$', path)
+        if m:
+            return _pool(int(m.group(1)), int(m.group(2)), m.group(3) is not None)
+        return None
+
+
+def connection(directory, session=None, **kwargs):
+    """ Connection answered by the synthetic league, without network access.
+    - directory: directory the responses are recorded in
+    - session: SyntheticYahoo (or subclass) answering the requests, a new one
+               by default
+    - kwargs: other arguments of Connection (cache, schedule, snapshot...)
+    Returns: [Connection]
+    """
+    if session is None:
+        session = SyntheticYahoo()
+    return Connection(None, transport=RecordingTransport(directory, session=session),
+                      **kwargs)
@@ -0,0 +1,57 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+from requests.exceptions import HTTPError
+
+from pyfantasy import ReplayTransport
+
+try:
+    import aiohttp
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    from pyfantasy.aio import AsyncConnection, _http_error
+except ImportError:
+    aiohttp = None
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class TestErrors(unittest.TestCase):
+
+    def test_replay_not_found(self):
+        directory = tempfile.mkdtemp()
+
+        async def get():
+            aconn = AsyncConnection(None, transport=ReplayTransport(directory))
+            try:
+                return await aconn.get('league/363.l.1/standings')
+            finally:
+                await aconn.close()
+        try:
+            with self.assertRaises(HTTPError) as cm:
+                asyncio.run(get())
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(cm.exception.response.status_code, 404)
+        self.assertIn('league/363.l.1/standings', str(cm.exception))
+
+    def test_response_error(self):
+        async def not_found(request):
+            return web.Response(status=404, text='no such league')
+
+        async def get():
+            app = web.Application()
+            app.router.add_get('/league', not_found)
+            async with TestServer(app) as server:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(server.make_url('/league')) as r:
+                        return _http_error(r, await r.text())
+        error = asyncio.run(get())
+        self.assertIsInstance(error, aiohttp.ClientResponseError)
+        self.assertEqual(error.status, 404)
+        self.assertIn('/league', str(error))
+
+
+if __name__ == '__main__':
+    unittest.main()
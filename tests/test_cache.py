@@ -0,0 +1,32 @@
+import unittest
+
+from pyfantasy import ResponseCache, MemoryCache, SqliteCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_ttls(self):
+        cache = ResponseCache()
+        self.assertEqual(cache.ttl('league/363.l.1/settings'), 6 * 3600)
+        self.assertEqual(cache.ttl('players;player_keys=nhl.p.1/draft_analysis'), 24 * 3600)
+        self.assertEqual(cache.ttl('team/363.l.1.t.1/roster#iter_rosters'), 5 * 60)
+
+    def test_players_pool_not_cached(self):
+        cache = ResponseCache()
+        url = ('league/363.l.1/players;status=A;sort=AR;start=0;count=25'
+               '/draft_analysis#iter_players')
+        self.assertEqual(cache.ttl(url), 0)
+        cache.set(url, ['player'])
+        self.assertIsNone(cache.get(url))
+
+    def test_delete(self):
+        for backend in (MemoryCache(), SqliteCache(':memory:')):
+            backend.set('team/1', 1, 60)
+            backend.set('team/10', 10, 60)
+            backend.delete('team/1')
+            self.assertIsNone(backend.get('team/1'))
+            self.assertEqual(backend.get('team/10'), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import time
+import threading
+import unittest
+
+from requests.exceptions import HTTPError
+
+from pyfantasy import Connection
+from pyfantasy.coalesce import Batch, split_collection
+from helpers import SyntheticTestCase
+import synthetic
+
+
+def collection(kind, keys):
+    return {kind + 's': {kind: [{kind + '_key': k, 'name': k} for k in keys]}}
+
+
+class FakeConnection:
+    """ Answers the collection calls with one item per key, or raises error. """
+    cache = None
+    _strip_url = staticmethod(Connection._strip_url)
+
+    def __init__(self, error=None):
+        self.urls = []
+        self.error = error
+
+    def _get(self, url, cache=True):
+        self.urls.append(url)
+        if self.error is not None:
+            raise self.error
+        if 's;' not in url:
+            return {'url': url}
+        kind, rest = url.split('s;', 1)
+        return collection(kind, rest.split('=', 1)[1].split('/', 1)[0].split(','))
+
+    def map(self, func, iterable):
+        return [func(x) for x in iterable]
+
+
+class TestSplitCollection(unittest.TestCase):
+
+    def test_by_key(self):
+        parts = split_collection('player', ['nhl.p.2', 'nhl.p.1'],
+                                 collection('player', ['nhl.p.1', 'nhl.p.2']))
+        self.assertEqual(parts['nhl.p.1'], {'player': {'player_key': 'nhl.p.1',
+                                                       'name': 'nhl.p.1'}})
+        self.assertEqual(parts['nhl.p.2']['player']['player_key'], 'nhl.p.2')
+
+    def test_single_item(self):
+        data = {'teams': {'team': {'team_key': '363.l.1.t.1'}}}
+        self.assertEqual(split_collection('team', ['363.l.1.t.1'], data),
+                         {'363.l.1.t.1': {'team': {'team_key': '363.l.1.t.1'}}})
+
+    def test_normalized_keys(self):
+        # game codes come back as game ids, in the order of the call
+        parts = split_collection('player', ['nhl.p.1', 'nhl.p.2'],
+                                 collection('player', ['363.p.1', '363.p.2']))
+        self.assertEqual(parts['nhl.p.1']['player']['player_key'], '363.p.1')
+        self.assertEqual(parts['nhl.p.2']['player']['player_key'], '363.p.2')
+
+    def test_missing_key(self):
+        parts = split_collection('player', ['nhl.p.1', 'nhl.p.2'],
+                                 collection('player', ['nhl.p.2']))
+        self.assertEqual(list(parts), ['nhl.p.2'])
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_max_keys(self):
+        conn = FakeConnection()
+        keys = ['nhl.p.{}'.format(i) for i in range(60)]
+        with Batch(conn, max_keys=25) as batch:
+            results = [batch.get('player/{}/draft_analysis'.format(k)) for k in keys]
+            other = batch.get('game/nhl')
+        self.assertEqual(len(conn.urls), 4)
+        self.assertEqual([len(url.split('=', 1)[1].split('/')[0].split(','))
+                          for url in conn.urls[:3]], [25, 25, 10])
+        self.assertTrue(all(url.endswith('/draft_analysis') for url in conn.urls[:3]))
+        self.assertEqual([r.result()['player']['player_key'] for r in results], keys)
+        self.assertEqual(other.result(), {'url': 'game/nhl'})
+
+    def test_error_reaches_every_waiter(self):
+        error = HTTPError('500 Error')
+        conn = FakeConnection(error)
+        with Batch(conn, max_keys=2) as batch:
+            results = [batch.get('team/363.l.1.t.{}'.format(i)) for i in range(1, 6)]
+        self.assertEqual(len(conn.urls), 3)
+        for result in results:
+            with self.assertRaises(HTTPError) as cm:
+                result.result(1)
+            self.assertIs(cm.exception, error)
+
+
+class SlowSession(synthetic.SyntheticYahoo):
+    """ Synthetic session taking a while to answer. """
+
+    def get(self, url, **kwargs):
+        time.sleep(0.1)
+        return synthetic.SyntheticYahoo.get(self, url, **kwargs)
+
+
+class TestInflight(SyntheticTestCase):
+    session_class = SlowSession
+
+    def get_concurrently(self, url, n=8):
+        barrier = threading.Barrier(n)
+        out = [None] * n
+
+        def get(i):
+            barrier.wait()
+            try:
+                out[i] = self.conn.get(url)
+            except Exception as e:
+                out[i] = e
+        threads = [threading.Thread(target=get, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return out
+
+    def test_single_request(self):
+        out = self.get_concurrently('league/{}/standings'.format(synthetic.LEAGUE_KEY))
+        self.assertEqual(len(self.session.gets), 1)
+        self.assertTrue(all(data is out[0] for data in out))
+        self.assertIn('league', out[0])
+
+    def test_error_shared(self):
+        out = self.get_concurrently('league/{}/unknown'.format(synthetic.LEAGUE_KEY))
+        self.assertEqual(len(self.session.gets), 1)
+        self.assertTrue(all(isinstance(e, HTTPError) for e in out))
+
+
+if __name__ == '__main__':
+    unittest.main()
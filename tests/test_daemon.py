@@ -0,0 +1,42 @@
+import os
+import json
+import datetime
+import unittest
+
+from pyfantasy import Schedule
+from pyfantasy.daemon import LineupDaemon, RULES_PATH
+from helpers import SyntheticTestCase
+import synthetic
+
+
+class TestLineupDaemon(SyntheticTestCase):
+
+    def setUp(self):
+        SyntheticTestCase.setUp(self)
+        schedule = Schedule([('2017-10-04', 'MTL', 'TOR', '2017-10-04T23:00:00Z'),
+                             ('2017-10-04', 'BOS', 'NYR', '2017-10-05T02:00:00Z')])
+        self.now = schedule.first_start('2017-10-04') - 1000
+        self.daemon = LineupDaemon(
+            self.conn, [synthetic.team_key(n) for n in sorted(synthetic.ROSTER_SIZES)],
+            json.load(open(RULES_PATH)), schedule,
+            status_path=os.path.join(self.directory, 'status.json'),
+            clock=lambda: self.now)
+
+    def test_set_job(self):
+        self.assertEqual(self.daemon.schedule_day(datetime.date(2017, 10, 4)),
+                         datetime.date(2017, 10, 4))
+        self.assertEqual(self.daemon.run_pending(), 1)
+        results = self.daemon.teams
+        self.assertEqual(sorted(results), sorted(self.daemon.team_keys))
+        for result in results.values():
+            self.assertNotIn('error', result)
+        self.assertEqual(len(self.session.puts),
+                         sum(1 for r in results.values() if r['changes']))
+        status = json.load(open(self.daemon.status_path))
+        self.assertEqual(status['errors'], 0)
+        self.assertEqual(status['queue_depth'], 1)
+        self.assertEqual(status['next']['job'], 'refresh')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import unittest
+
+from pyfantasy import TransactionCursor
+from helpers import SyntheticTestCase
+import synthetic
+
+
+class TestTransactions(SyntheticTestCase):
+
+    def setUp(self):
+        SyntheticTestCase.setUp(self)
+        self.league = self.conn.get_league(synthetic.LEAGUE_KEY)
+        self.cursor = TransactionCursor(os.path.join(self.directory, 'cursor.json'))
+        del self.session.gets[:]
+
+    def test_iter_transactions_pages(self):
+        rows = list(self.league.iter_transactions(since=synthetic.NUM_TRANSACTIONS - 20))
+        self.assertEqual(len(rows), 2 * 20)
+        self.assertEqual([url.rsplit('/', 1)[1] for url in self.session.gets],
+                         ['transactions;start=0;count=5', 'transactions;start=5;count=25'])
+
+    def test_poll_twice(self):
+        rows = self.league.new_transactions(self.cursor)
+        self.assertEqual(len(rows), 2 * synthetic.NUM_TRANSACTIONS)
+        self.assertEqual(self.cursor.get(synthetic.LEAGUE_KEY), synthetic.NUM_TRANSACTIONS)
+        del self.session.gets[:]
+
+        cursor = TransactionCursor(self.cursor.filepath)
+        self.assertEqual(self.league.new_transactions(cursor), [])
+        self.assertEqual(len(self.session.gets), 1)
+        self.assertTrue(self.session.gets[0].endswith('transactions;start=0;count=5'))
+
+
+class TestStats(SyntheticTestCase):
+
+    def test_types_from_settings(self):
+        league = self.conn.get_league(synthetic.LEAGUE_KEY)
+        types = dict((league.stats[k][0], t) for k, t in league._stat_types.items())
+        self.assertIs(types['G'], int)
+        self.assertIs(types['SV%'], float)
+        self.assertIs(types['GAA'], float)
+        self.assertEqual(league._convert_stat('1', '3'), 3)
+        self.assertIsNone(league._convert_stat('1', '-'))
+
+    def test_values_do_not_change_types(self):
+        league = self.conn.get_league(synthetic.LEAGUE_KEY)
+        types = dict(league._stat_types)
+        # the synthetic values of the integer stats are not integers
+        standings = league.get_standings()
+        self.assertIsInstance(standings[0]['G'], float)
+        self.assertEqual(league._stat_types, types)
+        self.assertEqual(league._convert_stat('1', '3'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
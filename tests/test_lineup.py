@@ -0,0 +1,153 @@
+import os
+import json
+import random
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    mock = None
+
+import pyfantasy
+from pyfantasy import lineup
+from pyfantasy.pyfantasy import Player
+from pyfantasy.xml_stream import PlayerRecord
+
+try:
+    import networkx as nx
+except ImportError:
+    nx = None
+
+RULES = json.load(open(os.path.join(os.path.dirname(pyfantasy.__file__), 'rule.json')))
+POSITIONS = ['C', 'C', 'LW', 'LW', 'RW', 'RW', 'D', 'D', 'D', 'D', 'Util', 'G', 'G',
+             'BN', 'BN', 'IR']
+ELIGIBLE = [['C'], ['LW', 'RW'], ['C', 'LW'], ['D'], ['G'], ['RW'], ['C', 'RW']]
+TEAMS = ['Bos', 'Mtl', 'Tor', 'NYR', 'Pit', 'Chi', 'Edm', 'Cgy', 'Van', 'LA']
+
+
+def make_roster(n, rnd):
+    return [Player(PlayerRecord(
+        player_key='nhl.p.{}'.format(i), name={'full': 'Player {}'.format(i)},
+        selected_position=rnd.choice(POSITIONS + ['IR'] * 3), position='',
+        eligible_positions=rnd.choice(ELIGIBLE), nhl_team=rnd.choice(TEAMS),
+        status=rnd.choice(['OK'] * 8 + ['DTD', 'IR']), rank=rnd.randint(1, 700)), None)
+        for i in range(n)]
+
+
+def random_weights(n, m, rnd):
+    return [[rnd.choice([lineup.INELIGIBLE, rnd.randint(-5, 20), rnd.random() * 20])
+             for _ in range(m)] for _ in range(n)]
+
+
+def value(weights, pairs):
+    return sum(weights[i][j] for i, j in pairs)
+
+
+def brute_force(weights, i=0, used=()):
+    """ Best value of the rows from i, each row taking a free column or none. """
+    if i == len(weights):
+        return 0.
+    best = brute_force(weights, i + 1, used)
+    for j, w in enumerate(weights[i]):
+        if j not in used and w > lineup.INELIGIBLE:
+            best = max(best, w + brute_force(weights, i + 1, used + (j,)))
+    return best
+
+
+def matching_value(weights):
+    """ Value of the maximum weight matching of weights with networkx. """
+    graph = nx.Graph()
+    for i, row in enumerate(weights):
+        for j, w in enumerate(row):
+            if w > lineup.INELIGIBLE:
+                graph.add_edge(('player', i), ('slot', j), weight=float(w))
+    return sum(graph[u][v]['weight'] for u, v in nx.max_weight_matching(graph))
+
+
+@unittest.skipIf(mock is None, 'unittest.mock is not available')
+class TestSolve(unittest.TestCase):
+    """ solve against brute force and networkx, with each solver. """
+
+    def solvers(self):
+        """ Yields the name of the solver, with solve patched to use it. """
+        with mock.patch.object(lineup, 'linear_sum_assignment', None):
+            with mock.patch.object(lineup, 'np', None):
+                yield '_hungarian'
+            if lineup.np is not None:
+                with mock.patch.object(lineup, 'NUMPY_MIN_SIZE', 0), \
+                        mock.patch.object(lineup, '_hungarian_numpy',
+                                          wraps=lineup._hungarian_numpy) as solver:
+                    yield '_hungarian_numpy'
+                    self.assertTrue(solver.called)
+
+    def test_brute_force(self):
+        rnd = random.Random(1)
+        cases = [random_weights(rnd.randint(1, 6), rnd.randint(1, 5), rnd)
+                 for _ in range(100)]
+        for name in self.solvers():
+            for weights in cases:
+                pairs = lineup.solve(weights)
+                self.assertEqual(len(set(j for _, j in pairs)), len(pairs))
+                self.assertAlmostEqual(value(weights, pairs), brute_force(weights),
+                                       msg=name)
+
+    @unittest.skipIf(nx is None, 'networkx is not installed')
+    def test_rosters(self):
+        rnd = random.Random(2)
+        slots = lineup.roster_slots(POSITIONS)
+        playing = set(TEAMS[:5])
+        for n in (10, 16, 25, 40):
+            players = make_roster(n, rnd)
+            weights = [list(row) for row in
+                       lineup.build_weights(players, slots, RULES, playing)]
+            expected = matching_value(weights)
+            for name in self.solvers():
+                best = lineup.assign(players, slots, weights)
+                pairs = [(i, slots.index(best[p.name['full']]))
+                         for i, p in enumerate(players) if p.name['full'] in best]
+                self.assertAlmostEqual(value(weights, pairs), expected, msg=name)
+                # the IR spot stays taken by a player already on IR
+                on_ir = best.get(('IR', 1))
+                self.assertIn(on_ir, [p.name['full'] for p in players
+                                      if p.selected_position == 'IR'])
+
+
+class TestRecommendSwaps(unittest.TestCase):
+
+    def lineup_value(self, players, slots, schedule):
+        total = 0.
+        for _, playing in schedule:
+            weights = lineup.build_weights(players, slots, RULES, playing)
+            total += value(weights, lineup.solve(weights))
+        return total
+
+    def test_brute_force(self):
+        rnd = random.Random(3)
+        slots = lineup.roster_slots(POSITIONS)
+        players = make_roster(16, rnd)
+        candidates = make_roster(12, rnd)
+        for i, c in enumerate(candidates):
+            c.player_key = 'nhl.p.{}'.format(100 + i)
+            c.name = {'full': 'Candidate {}'.format(i)}
+        schedule = [(day, set(rnd.sample(TEAMS, 5))) for day in range(3)]
+        schedule.append((3, schedule[0][1]))
+
+        base = self.lineup_value(players, slots, schedule)
+        gains = dict()
+        for i in range(len(players)):
+            for c, candidate in enumerate(candidates):
+                roster = players[:i] + [candidate] + players[i + 1:]
+                gains[i, c] = self.lineup_value(roster, slots, schedule) - base
+        expected = sorted((g for g in gains.values() if g > 0), reverse=True)[:5]
+
+        swaps = lineup.recommend_swaps(players, candidates, slots, RULES, schedule, k=5)
+        self.assertEqual(len(expected), 5)
+        self.assertEqual(len(swaps), len(expected))
+        for swap, gain in zip(swaps, expected):
+            self.assertAlmostEqual(swap.gain, gain)
+            self.assertAlmostEqual(swap.gain, gains[players.index(swap.drop),
+                                                   candidates.index(swap.add)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from pyfantasy import utils
+from pyfantasy.yahoo_oauth import OAuth2
+
+
+class Session:
+    def __init__(self, token):
+        self._token = token
+        # access token of the OAuth2 object when the session token changed
+        self.published = []
+
+    @property
+    def access_token(self):
+        return self._token
+
+    @access_token.setter
+    def access_token(self, token):
+        self.published.append(Service.oauth.access_token)
+        self._token = token
+
+
+class Response:
+    def __init__(self, token):
+        self.content = json.dumps({'access_token': token, 'token_type': 'bearer',
+                                   'refresh_token': 'refresh',
+                                   'xoauth_yahoo_guid': 'guid'}).encode('utf-8')
+
+
+class Service:
+    """ rauth service handing out new tokens, slowly. """
+    oauth = None
+
+    def __init__(self, **params):
+        self.calls = []
+
+    def get_session(self, token):
+        return Session(token)
+
+    def get_raw_access_token(self, data=None, headers=None):
+        # the credentials in use must not change before the session does
+        self.calls.append((Service.oauth.access_token, Service.oauth.session.access_token))
+        time.sleep(0.05)
+        return Response('token{}'.format(len(self.calls)))
+
+
+class TestRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cred.json')
+        with open(self.path, 'w') as fp:
+            json.dump({'consumer_key': 'key', 'consumer_secret': 'secret',
+                       'access_token': 'token0', 'token_type': 'bearer',
+                       'refresh_token': 'refresh', 'token_time': time.time()}, fp)
+        self.service = utils.services['oauth2']['SERVICE']
+        utils.services['oauth2']['SERVICE'] = Service
+        Service.oauth = self.oauth = OAuth2(None, None, from_file=self.path)
+
+    def tearDown(self):
+        utils.services['oauth2']['SERVICE'] = self.service
+        shutil.rmtree(self.directory)
+
+    def test_single_refresh(self):
+        threads = [threading.Thread(target=self.oauth.refresh, args=('token0',))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.oauth.oauth.calls, [('token0', 'token0')])
+        # no thread could read the new token while the session had the old one
+        self.assertEqual(self.oauth.session.published, ['token0'])
+        self.assertEqual(self.oauth.access_token, 'token1')
+        self.assertEqual(self.oauth.session.access_token, 'token1')
+        with open(self.path) as fp:
+            self.assertEqual(json.load(fp)['access_token'], 'token1')
+
+    def test_no_write_with_valid_token(self):
+        mtime = os.path.getmtime(self.path)
+        time.sleep(0.01)
+        OAuth2(None, None, from_file=self.path)
+        self.assertEqual(os.path.getmtime(self.path), mtime)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import datetime
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    mock = None
+
+from pyfantasy import Schedule
+from helpers import SyntheticTestCase
+import synthetic
+
+GAMES = [('2017-10-09', 'MTL', 'TOR'), ('2017-10-10', 'BOS', 'NYR'),
+         ('2017-10-11', 'PIT', 'CHI'), ('2017-10-12', 'EDM', 'VAN'),
+         ('2017-10-12', 'LAK', 'CGY')]
+
+
+class TestSchedule(SyntheticTestCase):
+
+    def setUp(self):
+        SyntheticTestCase.setUp(self)
+        self.schedule = Schedule(GAMES)
+
+    def test_index(self):
+        self.assertEqual(self.schedule.playing('2017-10-12'),
+                         frozenset(['Edm', 'Van', 'LA', 'Cgy']))
+        self.assertEqual(self.schedule.games_remaining('Mtl', '2017-10-09'), 1)
+        self.assertEqual(self.schedule.games_remaining('Mtl', '2017-10-10'), 0)
+        self.assertEqual(self.schedule.next_date('2017-10-13'), None)
+
+    def test_plan_lineups_date_bounds(self):
+        team = self.conn.get_team(synthetic.team_key(1), get_rank=True)
+        plan = team.plan_lineups([], self.schedule, start='2017-10-11',
+                                 end=datetime.datetime(2017, 10, 12, 20))
+        self.assertEqual(list(plan), [datetime.date(2017, 10, 11),
+                                      datetime.date(2017, 10, 12)])
+
+
+def week(start, games, next_start):
+    """ Response of the NHL web API for the week of start. """
+    return {'nextStartDate': next_start, 'gameWeek': [
+        {'date': day, 'games': [{'season': season, 'gameType': kind,
+                                 'homeTeam': {'abbrev': home},
+                                 'awayTeam': {'abbrev': away},
+                                 'startTimeUTC': day + 'T23:00:00Z'}]}
+        for day, season, kind, home, away in games]}
+
+
+class TestFetch(unittest.TestCase):
+
+    def setUp(self):
+        if mock is None:
+            self.skipTest('unittest.mock is not available')
+
+    def test_fetch_regular_season(self):
+        pages = {
+            '2024-09-01': week('2024-09-01', [], '2024-09-22'),
+            '2024-09-22': week('2024-09-22', [('2024-09-22', 20242025, 1, 'MTL', 'TOR')],
+                               '2024-10-08'),
+            '2024-10-08': week('2024-10-08', [('2024-10-08', 20242025, 2, 'MTL', 'TOR'),
+                                              ('2024-10-09', 20242025, 2, 'LAK', 'UTA')],
+                               '2025-02-10'),
+            # 4 Nations Face-Off, no regular season game
+            '2025-02-10': week('2025-02-10', [('2025-02-12', 20242025, 9, 'CAN', 'SWE')],
+                               '2025-02-22'),
+            '2025-02-22': week('2025-02-22', [('2025-02-22', 20242025, 2, 'BOS', 'NYR')],
+                               '2025-04-19'),
+            '2025-04-19': week('2025-04-19', [('2025-04-19', 20242025, 3, 'MTL', 'WSH')],
+                               '2025-04-26'),
+        }
+
+        def get(url):
+            response = mock.Mock()
+            response.json.return_value = pages[url.rsplit('/', 1)[1]]
+            return response
+
+        with mock.patch('requests.get', side_effect=get) as requests_get:
+            schedule = Schedule.fetch('20242025')
+        self.assertEqual(requests_get.call_count, 6)
+        self.assertEqual(len(schedule.games_list), 3)
+        self.assertEqual(schedule.playing('2025-02-22'), frozenset(['Bos', 'NYR']))
+        self.assertEqual(schedule.playing('2024-10-09'), frozenset(['LA', 'Uta']))
+        self.assertEqual(schedule.first_start('2024-10-08'), 1728428400.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
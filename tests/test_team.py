@@ -0,0 +1,113 @@
+import os
+import sys
+import datetime
+import unittest
+
+from pyfantasy import ResponseCache
+from helpers import SyntheticTestCase
+import synthetic
+
+
+class TestTeamRanks(SyntheticTestCase):
+
+    def setUp(self):
+        SyntheticTestCase.setUp(self)
+        self.team = self.conn.get_team(synthetic.team_key(1))
+
+    def test_ranks_after_roster(self):
+        self.team.players
+        ranks = self.team.ranks
+        self.assertEqual(len(ranks), synthetic.ROSTER_SIZES[1])
+        self.assertNotIn(None, ranks.values())
+
+    def test_prefetch_ranks_after_roster(self):
+        self.team.players
+        self.team.prefetch('ranks')
+        self.assertNotIn(None, [p.rank for p in self.team.players])
+        self.team.start_active([], playing_teams=set(synthetic.NHL_TEAMS))
+
+    def test_get_team_ranks_after_roster(self):
+        self.team.players
+        self.assertIs(self.conn.get_team(self.team.team_key, get_rank=True), self.team)
+        self.assertNotIn(None, [p.rank for p in self.team.players])
+
+
+class TestIdentityMap(SyntheticTestCase):
+
+    def test_load_teams_reuses_team(self):
+        team = self.conn.get_team(synthetic.team_key(2), get_rank=True)
+        team.players
+        loaded = self.conn.load_teams([synthetic.team_key(1), synthetic.team_key(2)])
+        self.assertIs(loaded[1], team)
+        self.assertIs(self.conn.get_team(synthetic.team_key(1)), loaded[0])
+        self.assertNotIn(None, [p.rank for p in team.players])
+        self.assertIsNone(loaded[0].players[0].rank)
+
+    def test_async_get_team_reuses_team(self):
+        try:
+            import asyncio
+            from pyfantasy.aio import AsyncConnection
+        except ImportError:
+            self.skipTest('aiohttp is not installed')
+        aconn = AsyncConnection(None, transport=self.conn.transport)
+        team = aconn.connection.get_team(synthetic.team_key(3))
+
+        async def load():
+            try:
+                return await aconn.get_team(synthetic.team_key(3), get_rank=True)
+            finally:
+                await aconn.close()
+        self.assertIs(asyncio.run(load()), team)
+        self.assertNotIn(None, [p.rank for p in team.players])
+
+    def test_scoreboard_of_each_team(self):
+        teams = self.conn.load_teams([synthetic.team_key(1), synthetic.team_key(5)])
+        self.assertIs(teams[0].league, teams[1].league)
+        for team in teams:
+            self.assertIn(team.name, [t['team'] for t in team.get_scoreboard()[0]])
+        self.assertEqual(len(teams[0].league.get_scoreboard()), synthetic.NUM_TEAMS // 2)
+
+
+class TestUpdateRoster(SyntheticTestCase):
+
+    def setUp(self):
+        self.connection_kwargs = {'cache': ResponseCache(ttls=[('.', 60)])}
+        SyntheticTestCase.setUp(self)
+
+    def test_invalidates_own_team_only(self):
+        team = self.conn.get_team(synthetic.team_key(1), get_rank=True)
+        urls = ['team/{}'.format(team.team_key), 'team/{}/roster'.format(team.team_key),
+                'team/{}0'.format(team.team_key), 'team/{}0/roster'.format(team.team_key)]
+        for url in urls:
+            self.conn.cache.set(url, {'team': url})
+        team.update_roster(team.start_active([], playing_teams=set(synthetic.NHL_TEAMS)))
+        self.assertEqual([url for url in urls if self.conn.cache.get(url) is not None],
+                         urls[2:])
+
+    def test_set_lineups_more_players_than_slots(self):
+        team = self.conn.get_team(synthetic.team_key(3), get_rank=True)
+        schedule = {datetime.date(2017, 10, 4): set(synthetic.NHL_TEAMS[:5]),
+                    datetime.date(2017, 10, 5): set(synthetic.NHL_TEAMS[5:])}
+        plan = team.plan_lineups([], schedule)
+        unassigned = [p for p in team.players if p.name['full'] not in plan[min(plan)]]
+        self.assertTrue(unassigned)
+        responses = team.set_lineups(plan)
+        self.assertEqual(len(responses), len(self.session.puts))
+        self.assertTrue(responses)
+
+
+
+class TestImports(unittest.TestCase):
+
+    def test_connection_without_numpy(self):
+        import subprocess
+        code = ('import sys, pyfantasy; pyfantasy.Connection; '
+                'print(sorted(m for m in ("numpy", "yaml", "pyfantasy.lineup") '
+                'if m in sys.modules))')
+        out = subprocess.check_output([sys.executable, '-c', code], cwd=os.path.join(
+            os.path.dirname(__file__), '..'))
+        self.assertEqual(out.strip(), b'[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
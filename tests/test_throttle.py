@@ -0,0 +1,157 @@
+import time
+import unittest
+from email.utils import formatdate
+
+try:
+    from unittest import mock
+except ImportError:
+    mock = None
+
+from requests.exceptions import HTTPError
+
+from pyfantasy.throttle import Throttle, TokenBucket, retry_after
+from pyfantasy.transport import make_response
+from helpers import SyntheticTestCase
+import synthetic
+
+NOW = 1500000000.
+
+
+class Clock:
+    """ time.time and time.sleep of a clock only moving when slept on. """
+
+    def __init__(self):
+        self.now = NOW
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def patch(self):
+        return mock.patch.multiple(time, time=self.time, sleep=self.sleep)
+
+
+class ThrottledSession(synthetic.SyntheticYahoo):
+    """ Synthetic session answering the gets with the statuses given first. """
+
+    def __init__(self):
+        synthetic.SyntheticYahoo.__init__(self)
+        self.statuses = []
+        self.headers = {}
+
+    def get(self, url, **kwargs):
+        if self.statuses:
+            status = self.statuses.pop(0)
+            if status != 200:
+                r = make_response(url, b'', status, 'Throttled')
+                r.headers.update(self.headers)
+                return r
+        return synthetic.SyntheticYahoo.get(self, url, **kwargs)
+
+
+def upper_bound(a, b):
+    return b
+
+
+@unittest.skipIf(mock is None, 'unittest.mock is not available')
+class TestTokenBucket(unittest.TestCase):
+
+    def test_reserve(self):
+        clock = Clock()
+        with clock.patch():
+            bucket = TokenBucket(2)
+            self.assertEqual([bucket.reserve() for _ in range(4)], [0., 0., 0.5, 1.])
+            clock.sleep(1.)
+            self.assertEqual(bucket.reserve(), 0.5)
+
+    def test_rate(self):
+        bucket = TokenBucket(16, min_rate=3)
+        bucket.decrease()
+        self.assertEqual(bucket.rate, 8)
+        bucket.increase()
+        self.assertAlmostEqual(bucket.rate, 8.16)
+        for _ in range(5):
+            bucket.decrease()
+        self.assertEqual(bucket.rate, 3)
+        for _ in range(200):
+            bucket.increase()
+        self.assertEqual(bucket.rate, 16)
+
+
+@unittest.skipIf(mock is None, 'unittest.mock is not available')
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_retry_after(self):
+        self.assertIsNone(retry_after({}))
+        self.assertEqual(retry_after({'Retry-After': '5'}), 5.)
+        self.assertEqual(retry_after({'Retry-After': '-1'}), 0.)
+        self.assertIsNone(retry_after({'Retry-After': 'soon'}))
+        with Clock().patch():
+            self.assertEqual(retry_after({'Retry-After': formatdate(NOW + 30)}), 30.)
+
+    def test_backoff(self):
+        throttle = Throttle(backoff=0.5, max_backoff=3, max_retries=4)
+        with mock.patch('random.uniform', side_effect=upper_bound) as uniform:
+            delays = [throttle.retry_delay(999, {}, attempt) for attempt in range(5)]
+        self.assertEqual(delays, [0.5, 1., 2., 3., None])
+        self.assertEqual(uniform.call_count, 4)
+        self.assertEqual((throttle.retries, throttle.throttled), (4, 4))
+        self.assertEqual(throttle.wait_time, 6.5)
+
+    def test_server_error(self):
+        throttle = Throttle(rate=10)
+        with mock.patch('random.uniform', side_effect=upper_bound):
+            self.assertEqual(throttle.retry_delay(503, {'Retry-After': '2'}, 0), 2.)
+        self.assertEqual((throttle.retries, throttle.throttled), (1, 0))
+        self.assertEqual(throttle.bucket.rate, 10)
+        self.assertIsNone(throttle.retry_delay(404, {}, 0))
+
+
+@unittest.skipIf(mock is None, 'unittest.mock is not available')
+class TestConnectionRetries(SyntheticTestCase):
+    session_class = ThrottledSession
+
+    def setUp(self):
+        self.clock = Clock()
+        patch = self.clock.patch()
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.connection_kwargs = {'throttle': Throttle(rate=10, backoff=0.5)}
+        SyntheticTestCase.setUp(self)
+        self.url = 'league/{}/standings'.format(synthetic.LEAGUE_KEY)
+
+    def test_throttled_then_ok(self):
+        self.session.statuses = [999, 999, 200]
+        with mock.patch('random.uniform', side_effect=upper_bound):
+            data = self.conn.get(self.url)
+        self.assertIn('league', data)
+        self.assertEqual(self.session.statuses, [])
+        self.assertEqual(self.clock.sleeps, [0.5, 1.])
+        stats = self.conn.throttle.stats()
+        self.assertEqual((stats['retries'], stats['throttled']), (2, 2))
+        self.assertAlmostEqual(stats['rate'], 10 / 4 + 0.1)
+
+    def test_retry_after(self):
+        self.session.statuses = [999, 200]
+        self.session.headers = {'Retry-After': '7'}
+        with mock.patch('random.uniform') as uniform:
+            self.conn.get(self.url)
+        self.assertFalse(uniform.called)
+        self.assertEqual(self.clock.sleeps, [7.])
+
+    def test_gives_up(self):
+        self.conn.throttle.max_retries = 2
+        self.session.statuses = [999] * 3
+        with mock.patch('random.uniform', side_effect=upper_bound):
+            with self.assertRaises(HTTPError) as cm:
+                self.conn.get(self.url)
+        self.assertIn('999', str(cm.exception))
+        self.assertEqual(self.conn.throttle.retries, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
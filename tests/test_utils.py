@@ -0,0 +1,69 @@
+import os
+import shutil
+import datetime
+import tempfile
+import threading
+import unittest
+
+from pyfantasy import SettingsSnapshot, TransactionCursor
+from pyfantasy.utils import json_get_data, json_write_data
+
+
+def run_threads(target, n=8):
+    errors = []
+
+    def run(i):
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+class TestConcurrentWrites(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'data.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_json_write_data(self):
+        def write(i):
+            for n in range(50):
+                json_write_data({'thread': i, 'n': n}, self.path)
+        self.assertEqual(run_threads(write), [])
+        self.assertEqual(json_get_data(self.path)['n'], 49)
+        self.assertEqual(os.listdir(self.directory), ['data.json'])
+
+    def test_transaction_cursor(self):
+        cursor = TransactionCursor(self.path)
+        now = datetime.datetime(2017, 10, 4)
+
+        def write(i):
+            for n in range(50):
+                cursor.set('363.l.{}'.format(i), n, now)
+        self.assertEqual(run_threads(write), [])
+        marks = TransactionCursor(self.path).marks
+        self.assertEqual(sorted(marks), sorted('363.l.{}'.format(i) for i in range(8)))
+        self.assertEqual(set(m['transaction_id'] for m in marks.values()), {49})
+
+    def test_settings_snapshot(self):
+        snapshot = SettingsSnapshot(self.path)
+
+        def write(i):
+            for n in range(50):
+                snapshot.set('363.l.{}'.format(i), {'n': n})
+        self.assertEqual(run_threads(write), [])
+        self.assertEqual(SettingsSnapshot(self.path).settings,
+                         dict(('363.l.{}'.format(i), {'n': 49}) for i in range(8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import sqlite3
+import datetime
+import tempfile
+import unittest
+
+from pyfantasy import StatsWarehouse
+
+
+class FakeConnection:
+    """ Answers the stats calls with one stat per key and counts them. """
+
+    def __init__(self):
+        self.urls = []
+
+    def stream(self, url, extractor):
+        self.urls.append(url)
+        keys = url.split('=', 1)[1].split('/', 1)[0].split(',')
+        if url.startswith('teams'):
+            return [Team(k) for k in keys]
+        return [(k, [('1', '2')]) for k in keys]
+
+    def map(self, func, iterable):
+        return [func(x) for x in iterable]
+
+
+class Team:
+    def __init__(self, team_key):
+        self.team_key = team_key
+        self.stats = [('1', '3')]
+
+
+class TestStatsWarehouse(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = FakeConnection()
+        self.wh = StatsWarehouse(self.conn)
+
+    def test_past_dates_synced_once(self):
+        days = [datetime.date(2017, 10, 4) + datetime.timedelta(i) for i in range(3)]
+        self.assertEqual(self.wh.sync_players(['nhl.p.1', 'nhl.p.2'], days), 3)
+        self.assertEqual(self.wh.sync_players(['nhl.p.1', 'nhl.p.2'], days), 0)
+
+    def test_today_fetched_again(self):
+        today = datetime.date.today()
+        self.assertEqual(self.wh.sync_players(['nhl.p.1'], [today]), 1)
+        self.assertEqual(self.wh.sync_players(['nhl.p.1'], [today]), 1)
+        self.assertEqual(len(self.wh.query('player')), 1)
+
+    def test_current_week_fetched_again(self):
+        keys = ['363.l.1.t.1', '363.l.1.t.2']
+        self.assertEqual(self.wh.sync_teams(keys, [1, 2, 3], current_week=3), 3)
+        self.assertEqual(self.wh.sync_teams(keys, [1, 2, 3], current_week=3), 1)
+        self.assertEqual(self.conn.urls[-1].rsplit('=', 1)[1], '3')
+
+    def test_query_weeks(self):
+        keys = ['363.l.1.t.1']
+        self.wh.sync_teams(keys, range(1, 13), current_week=20)
+        rows = self.wh.query('team', start=2, end=11)
+        self.assertEqual([int(period) for _, period, _, _ in rows], list(range(2, 12)))
+        arrays = self.wh.load_arrays('team', keys, [9, 10], ['1'])
+        self.assertEqual([list(row) for row in arrays['1']], [[3., 3.]])
+
+    def test_unpadded_weeks_migrated(self):
+        path = os.path.join(tempfile.mkdtemp(), 'stats.sqlite')
+        try:
+            db = sqlite3.connect(path)
+            with db:
+                db.execute('CREATE TABLE stats (kind TEXT, key TEXT, period TEXT, '
+                           'stat_id TEXT, value, PRIMARY KEY (kind, key, period, stat_id))')
+                db.execute('CREATE TABLE synced (kind TEXT, key TEXT, period TEXT, '
+                           'PRIMARY KEY (kind, key, period))')
+                db.execute("INSERT INTO stats VALUES ('team', 't.1', '9', '1', 3.)")
+                db.execute("INSERT INTO synced VALUES ('team', 't.1', '9')")
+            db.close()
+            wh = StatsWarehouse(self.conn, path)
+            self.assertEqual(wh.query('team', start=2, end=11), [('t.1', '09', '1', 3.)])
+            self.assertEqual(wh.missing('team', ['t.1'], [9]), {})
+        finally:
+            shutil.rmtree(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    unittest.main()